@@ -1,13 +1,94 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Path, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
-from tasks import TaskManager, Task
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Literal
+from tasks import Task, BatchError, MAX_IMPORT_ERRORS, open_manager
+from groupcommit import GroupCommitter
+from cache import ResponseCache
+from changes import ChangeFeed, ResyncRequired
+from encoding import (accepts_gzip, dumps, encode_task, encode_tasks, gzip_body, gzip_stream,
+                      iter_encode_tasks)
+from scheduler import ReminderScheduler
+from pool import LIST_ID, MAX_OPEN, ManagerPool
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import uvicorn
+import logging
 import os
+import time
+from datetime import date
 
 
-app = FastAPI(title="Task Manager API", version="1.0.0")
+COMMIT_WINDOW = float(os.environ.get("TASKS_COMMIT_WINDOW_MS", 2)) / 1000
+task_manager = open_manager()
+committer = GroupCommitter(task_manager, window=COMMIT_WINDOW)
+# Named task lists, one shard file each under TASKS_LISTS_DIR, loaded on demand.
+pool = ManagerPool(os.environ.get("TASKS_LISTS_DIR", "lists"), os.environ.get("TASKS_BACKEND", "json"),
+                   max_open=int(os.environ.get("TASKS_POOL_SIZE", MAX_OPEN)),
+                   max_bytes=int(os.environ.get("TASKS_POOL_MEMORY_MB", 256)) * 2 ** 20,
+                   commit_window=COMMIT_WINDOW)
+logger = logging.getLogger(__name__)
+
+def log_reminder(task):
+    logger.info("Task %d is due %s: %s", task.id, task.due_date, task.title)
+
+# Add hooks with scheduler.add_hook(fn); fn(task) may be a coroutine.
+scheduler = ReminderScheduler(task_manager, [log_reminder])
+change_feed = ChangeFeed(task_manager.changes)
+
+@asynccontextmanager
+async def lifespan(app):
+    committer.start()
+    scheduler.start()
+    change_feed.start()
+    yield
+    change_feed.stop()
+    await scheduler.stop()
+    committer.stop()
+    pool.close()
+    task_manager.close()
+
+app = FastAPI(title="Task Manager API", version="1.0.0", lifespan=lifespan)
+
+REQUESTS = Counter("tasks_http_requests_total", "HTTP requests by method, route and status.",
+                   ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("tasks_http_request_duration_seconds", "HTTP request latency by method and route.",
+                            ("method", "route"))
+IN_FLIGHT = Gauge("tasks_http_requests_in_flight", "HTTP requests currently being handled.")
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request by its route template (``/tasks/{task_id}``), not the raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, scope["method"], path)
+            REQUESTS.inc(scope["method"], path, str(status))
+
+app.add_middleware(MetricsMiddleware)
 
 
 app.add_middleware(
@@ -18,7 +99,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-task_manager = TaskManager()
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+IMPORT_CHUNK_SIZE = 1000
+CHANGES_PAGE = 1000
+KEEPALIVE_SECONDS = 15  # idle time before an event stream sends a comment line and checks other processes
+STREAM_MIN = 2000  # lists longer than this are streamed instead of encoded in one piece
+GZIP_MIN = 1024    # smaller bodies aren't worth compressing
+
+response_cache = ResponseCache(int(os.environ.get("TASKS_CACHE_SIZE", 256)))
+
+Gauge("tasks_store_tasks", "Tasks in the store.", fn=lambda: len(task_manager))
+Gauge("tasks_store_bytes", "Bytes the store occupies on disk.", fn=lambda: task_manager.storage.size())
+Gauge("tasks_store_version", "Current store version.", fn=lambda: task_manager.version)
+Gauge("tasks_change_log_events", "Changes kept in the change log.", fn=lambda: len(task_manager.changes))
+Gauge("tasks_pool_lists_loaded", "Task lists currently loaded.", fn=lambda: len(pool))
+Gauge("tasks_pool_estimated_bytes", "Estimated memory held by loaded task lists.", fn=lambda: pool.estimated_bytes())
+Counter("tasks_pool_loads_total", "Task lists loaded from disk.", fn=lambda: pool.loads)
+Counter("tasks_pool_evictions_total", "Task lists evicted from the pool.", fn=lambda: pool.evictions)
+Counter("tasks_response_cache_hits_total", "Responses served from the response cache.", fn=lambda: response_cache.hits)
+Counter("tasks_response_cache_misses_total", "Responses built because the cache missed.",
+        fn=lambda: response_cache.misses)
 
 class TaskCreate(BaseModel):
     title: str
@@ -49,82 +150,524 @@ class TaskResponse(BaseModel):
             created_at=task.created_at
         )
 
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+class BatchCreate(BaseModel):
+    items: List[TaskCreate] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class BatchUpdate(BaseModel):
+    items: List[TaskBatchUpdate] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class BatchIds(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_BATCH_SIZE)
+
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    error: Optional[str] = None
+    task: Optional[TaskResponse] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class ListSummary(BaseModel):
+    id: str
+    tasks: int
+    statuses: Dict[str, int]
+    overdue: int
+
+class ListTaskResponse(TaskResponse):
+    list_id: str
+
+class ChangeEvent(BaseModel):
+    seq: int
+    op: Literal["create", "update", "complete", "delete"]
+    id: int
+    task: Optional[TaskResponse] = None
+
+class ChangesResponse(BaseModel):
+    seq: int = Field(..., description="Pass as since= to get the changes after these")
+    changes: List[ChangeEvent]
+    more: bool = Field(..., description="More changes are waiting; ask again right away")
+
+class ResyncResponse(BaseModel):
+    detail: str
+    seq: int = Field(..., description="Refetch the tasks, then follow changes since this")
+
+async def write(fn, *args, **kwargs):
+    """Run a TaskManager mutation on the writer thread; returns once it is durable."""
+    return await committer.submit(fn, *args, **kwargs)
+
+def json_response(request, body, headers=None, gzipped=None, status_code=200):
+    """A JSON Response, gzipped when the client accepts it and the body is big enough.
+
+    Pass ``gzipped`` to reuse an already compressed copy of ``body``.
+    """
+    headers = dict(headers or {})
+    if len(body) >= GZIP_MIN:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request.headers.get("accept-encoding")):
+            headers["Content-Encoding"] = "gzip"
+            body = gzipped if gzipped is not None else gzip_body(body)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+async def cached_response(request, version_of, build, manager=None):
+    """Serve a read endpoint with an ETag, answering 304 or from the response cache when possible.
+
+    ``version_of`` returns the version the response depends on and ``build``
+    returns ``(task or tasks, headers)``; both run under the manager's lock
+    after a sync of ``manager`` (default the main store). Tasks are encoded
+    straight to JSON bytes (the endpoints' ``response_model`` only documents
+    the shape), lists longer than ``STREAM_MIN`` are streamed, and cached
+    entries keep their gzipped copy.
+    """
+    gzip_ok = accepts_gzip(request.headers.get("accept-encoding"))
+    manager = manager or task_manager
+
+    def run():
+        manager.sync()
+        with manager.lock:
+            version = version_of()
+            etag = f'W/"{version[0]}-{version[1]}"' if isinstance(version, tuple) else f'W/"{version}"'
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            key = request.url.path + "?" + str(request.query_params)
+            hit = response_cache.get(key, version)
+            if hit is None:
+                data, headers = build()
+                headers = {**headers, "ETag": etag}
+                if isinstance(data, list) and len(data) > STREAM_MIN:
+                    def done(body):
+                        with manager.lock:
+                            if version_of() == version:
+                                response_cache.put(key, version, [body, headers, None])
+                    return stream_tasks(data, headers, gzip_ok, done, manager.lock)
+                # [body, headers, gzipped body or None until first asked for]
+                hit = [encode_task(data) if isinstance(data, Task) else encode_tasks(data), headers, None]
+                response_cache.put(key, version, hit)
+
+        body, headers, gzipped = hit
+        if gzip_ok and gzipped is None and len(body) >= GZIP_MIN:
+            gzipped = hit[2] = gzip_body(body)
+        return json_response(request, body, headers, gzipped)
+    return await run_in_threadpool(run)
+
+def stream_tasks(tasks, headers, gzip_ok, done, lock):
+    """Stream a long task list, encoding it a chunk at a time; ``done(body)`` gets the whole body at the end.
+
+    Rows are read when their chunk is sent, so a write landing mid-stream can
+    show up in later rows; the ETag names the version the list was taken at,
+    which is then no longer current, so it can't produce a wrong 304.
+    """
+    def chunks():
+        parts = []
+        for chunk in iter_encode_tasks(tasks, lock):
+            parts.append(chunk)
+            yield chunk
+        done(b"".join(parts))
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if gzip_ok:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(gzip_stream(chunks()), media_type="application/json", headers=headers)
+    return StreamingResponse(chunks(), media_type="application/json", headers=headers)
+
+def respond(task):
+    return TaskResponse.from_task(task) if task else None
+
+async def run_batch(request, method, items):
+    """Apply a TaskManager batch method, reporting each item's outcome as a BatchResponse body."""
+    try:
+        done = await write(method, items)
+    except BatchError as e:
+        # Nothing was applied, so no item is ok; only the invalid ones carry an error.
+        results = [{"index": n, "ok": False, "error": e.errors.get(n), "task": None} for n in range(len(items))]
+        return json_response(request, dumps({"results": results}), status_code=422)
+    results = [{"index": n, "ok": True, "error": None, "task": task.to_dict() if isinstance(task, Task) else None}
+               for n, task in enumerate(done)]
+    return json_response(request, dumps({"results": results}))
+
+def read_changes(since, limit):
+    """Sync, then return ``(body, seq, more)`` for the changes after ``since``; raises ResyncRequired."""
+    task_manager.sync()
+    with task_manager.lock:
+        log = task_manager.changes
+        if since is None:
+            return {"seq": log.seq, "changes": [], "more": False}
+        changes, seq = log.since(since, limit)
+        more = seq < log.seq
+    return {"seq": seq, "more": more,
+            "changes": [{"seq": n, "op": op, "id": task_id, "task": task} for n, op, task_id, task in changes]}
+
 # API Routes
 
 @app.get("/")
 async def root():
     return {"message": "Task Manager API", "version": "1.0.0"}
 
-@app.get("/tasks", response_model=List[TaskResponse])
-async def get_all_tasks():
-    tasks = task_manager.get_all()
-    return [TaskResponse.from_task(task) for task in tasks]
+PAGE_HEADERS = {200: {"headers": {
+    "X-Next-After-Id": {"description": "after_id for the next page; only sent when there are more tasks",
+                        "schema": {"type": "integer"}},
+    "X-Next-After-Due": {"description": "after_due for the next page of a due_date sort (empty for no due date)",
+                         "schema": {"type": "string"}}}}}
+# A batch with invalid items answers 422 with every item's outcome rather than a validation error.
+BATCH_ERRORS = {422: {"model": BatchResponse, "description": "Some items were invalid; nothing was applied"}}
+AFTER_DUE = Query(None, description="With a due_date sort: the X-Next-After-Due of the previous page")
+
+@app.get("/tasks", response_model=List[TaskResponse], responses=PAGE_HEADERS)
+async def get_all_tasks(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    after_due: Optional[str] = AFTER_DUE,
+    status: Optional[str] = None,
+    due_before: Optional[date] = None,
+    due_after: Optional[date] = None,
+    overdue: bool = False,
+    sort: Literal["id", "-id", "due_date", "-due_date"] = "id",
+):
+    return await query_response(request, task_manager, limit, after_id, after_due, status, due_before, due_after,
+                                overdue, sort)
+
+async def query_response(request, manager, limit, after_id, after_due, status, due_before, due_after, overdue, sort):
+    """A page of ``manager.query`` as a cached response, with ``X-Next-After-Id`` when there is more."""
+    def build():
+        try:
+            tasks = manager.query(
+                status=status,
+                due_before=due_before.isoformat() if due_before else None,
+                due_after=due_after.isoformat() if due_after else None,
+                overdue=overdue,
+                sort=sort,
+                after_id=after_id,
+                after_due=after_due,
+                limit=limit + 1 if limit else None,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        headers = {}
+        if limit and len(tasks) > limit:
+            tasks = tasks[:limit]
+            headers["X-Next-After-Id"] = str(tasks[-1].id)
+            if sort.endswith("due_date"):
+                headers["X-Next-After-Due"] = tasks[-1].due_date or ""
+        return tasks, headers
+    # overdue depends on today's date as well as on the store.
+    version = (lambda: (manager.version, date.today())) if overdue else (lambda: manager.version)
+    return await cached_response(request, version, build, manager)
 
 @app.post("/tasks", response_model=TaskResponse)
 async def create_task(task_data: TaskCreate):
-    task = task_manager.add_task(
+    task = await write(
+        task_manager.add_task,
         title=task_data.title,
         description=task_data.description,
         due_date=task_data.due_date
     )
     return TaskResponse.from_task(task)
 
+@app.get("/tasks/export")
+async def export_tasks():
+    def chunks(lines, size=1000):
+        buf = []
+        for line in lines:
+            buf.append(line)
+            if len(buf) >= size:
+                yield "".join(buf)
+                buf = []
+        if buf:
+            yield "".join(buf)
+    return StreamingResponse(chunks(task_manager.export_ndjson()), media_type="application/x-ndjson")
+
+@app.post("/tasks/import")
+async def import_tasks(request: Request, chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=MAX_BATCH_SIZE)):
+    """Stream an NDJSON body into the store, committing every ``chunk_size`` lines."""
+    start = time.perf_counter()
+    totals = {"imported": 0, "failed": 0, "errors": []}
+    line_no = 1
+    lines = []
+    tail = b""
+
+    async def apply(lines, first_line):
+        stats = await write(task_manager.import_ndjson, lines, chunk_size=chunk_size, first_line=first_line)
+        totals["imported"] += stats["imported"]
+        totals["failed"] += stats["failed"]
+        totals["errors"].extend(stats["errors"][:MAX_IMPORT_ERRORS - len(totals["errors"])])
+
+    async for data in request.stream():
+        parts = (tail + data).split(b"\n")
+        tail = parts.pop()
+        lines.extend(parts)
+        if len(lines) >= chunk_size:
+            await apply(lines, line_no)
+            line_no += len(lines)
+            lines = []
+    if tail:
+        lines.append(tail)
+    if lines:
+        await apply(lines, line_no)
+    seconds = time.perf_counter() - start
+    totals["seconds"] = round(seconds, 3)
+    totals["tasks_per_second"] = round(totals["imported"] / seconds) if seconds else 0
+    return totals
+
+@app.get("/tasks/overdue", response_model=List[TaskResponse])
+async def overdue_tasks(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    today = date.today()
+    return await cached_response(
+        request, lambda: (task_manager.version, today),
+        lambda: (task_manager.overdue(today.isoformat(), limit=limit), {}))
+
+@app.get("/tasks/upcoming", response_model=List[TaskResponse])
+async def upcoming_tasks(request: Request, days: int = Query(7, ge=0, le=3660),
+                         limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    today = date.today()
+    return await cached_response(
+        request, lambda: (task_manager.version, today),
+        lambda: (task_manager.upcoming(days, today.isoformat(), limit=limit), {}))
+
+@app.post("/tasks/batch", response_model=BatchResponse, responses=BATCH_ERRORS)
+async def create_tasks(request: Request, batch: BatchCreate):
+    return await run_batch(request, task_manager.add_many, [item.model_dump() for item in batch.items])
+
+@app.post("/tasks/batch/update", response_model=BatchResponse, responses=BATCH_ERRORS)
+async def update_tasks(request: Request, batch: BatchUpdate):
+    return await run_batch(request, task_manager.update_many, [item.model_dump() for item in batch.items])
+
+@app.post("/tasks/batch/complete", response_model=BatchResponse, responses=BATCH_ERRORS)
+async def complete_tasks(request: Request, batch: BatchIds):
+    return await run_batch(request, task_manager.complete_many, batch.ids)
+
+@app.post("/tasks/batch/delete", response_model=BatchResponse, responses=BATCH_ERRORS)
+async def delete_tasks(request: Request, batch: BatchIds):
+    return await run_batch(request, task_manager.delete_many, batch.ids)
+
 @app.get("/tasks/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: int):
-    task = task_manager.find(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return TaskResponse.from_task(task)
+async def get_task(task_id: int, request: Request):
+    return await task_response(request, task_manager, task_id)
 
 @app.put("/tasks/{task_id}", response_model=TaskResponse)
 async def update_task(task_id: int, task_data: TaskUpdate):
-    task = task_manager.find(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    success = task_manager.update(
-        task_id=task_id,
-        title=task_data.title,
-        description=task_data.description,
-        due_date=task_data.due_date
-    )
-    
-    if not success:
-        raise HTTPException(status_code=400, detail="Failed to update task")
-    
-    updated_task = task_manager.find(task_id)
-    return TaskResponse.from_task(updated_task)
+    return await apply_update(task_manager, write, task_id, task_data)
 
 @app.patch("/tasks/{task_id}/complete", response_model=TaskResponse)
 async def mark_task_complete(task_id: int):
-    success = task_manager.mark_complete(task_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    updated_task = task_manager.find(task_id)
-    return TaskResponse.from_task(updated_task)
+    return await apply_complete(task_manager, write, task_id)
 
 @app.delete("/tasks/{task_id}")
 async def delete_task(task_id: int):
-    success = task_manager.delete(task_id)
+    return await apply_delete(task_manager, write, task_id)
+
+# The single-task endpoints, for the main store or a list: ``submit`` queues a mutation on the store's committer.
+
+async def task_response(request, manager, task_id):
+    def version():
+        if manager.find(task_id) is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return manager.task_version(task_id)
+    return await cached_response(request, version, lambda: (manager.find(task_id), {}), manager)
+
+async def apply_update(manager, submit, task_id, task_data):
+    def update():
+        if manager.update(task_id, task_data.title, task_data.description, task_data.due_date):
+            return respond(manager.find(task_id))
+    updated_task = await submit(update)
+    if not updated_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return updated_task
+
+async def apply_complete(manager, submit, task_id):
+    def complete():
+        if manager.mark_complete(task_id):
+            return respond(manager.find(task_id))
+    updated_task = await submit(complete)
+    if not updated_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return updated_task
+
+async def apply_delete(manager, submit, task_id):
+    success = await submit(manager.delete, task_id)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found")
-    
     return {"message": f"Task {task_id} deleted successfully"}
 
 @app.get("/tasks/search/{keyword}", response_model=List[TaskResponse])
-async def search_tasks(keyword: str):
-    tasks = task_manager.search(keyword)
-    return [TaskResponse.from_task(task) for task in tasks]
+async def search_tasks(request: Request, keyword: str, limit: Optional[int] = Query(None, ge=1),
+                       mode: Literal["index", "substring"] = "index"):
+    return await cached_response(
+        request, lambda: task_manager.version,
+        lambda: (task_manager.search(keyword, limit=limit, mode=mode), {}))
+
+# Task lists. "search" and "overdue" name the cross-list queries, so they can't be list ids.
+RESERVED_LISTS = ("search", "overdue")
+LIST_ID_PATH = Path(..., pattern=LIST_ID, description="Letters, digits, '_' and '-'; up to 64 characters")
+
+@asynccontextmanager
+async def open_list(list_id, create=False):
+    """Hold a list's pool entry for the duration of a request; 404 if it doesn't exist and not ``create``."""
+    if list_id in RESERVED_LISTS:
+        raise HTTPException(status_code=404 if not create else 422, detail=f"{list_id!r} is reserved")
+    try:
+        entry = await run_in_threadpool(pool.acquire, list_id, create)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="List not found")
+    try:
+        yield entry
+    finally:
+        pool.release(entry)
+
+def held_until_sent(response, entry):
+    """Keep ``entry`` loaded until a streamed ``response`` is sent; its rows are encoded from the list as it goes."""
+    if isinstance(response, StreamingResponse):
+        pool.retain(entry)
+        response.background = BackgroundTask(pool.release, entry)
+    return response
+
+async def fan_out(fn):
+    """Run ``fn(manager)`` on every list in parallel; ``{list_id: result}``."""
+    return await run_in_threadpool(pool.map, fn)
+
+@app.get("/lists", response_model=List[ListSummary])
+async def get_lists():
+    today = date.today().isoformat()
+    found = await fan_out(lambda m: (len(m), m.status_counts(), len(m.overdue(today))))
+    return [ListSummary(id=list_id, tasks=n, statuses=statuses, overdue=overdue)
+            for list_id, (n, statuses, overdue) in found.items()]
+
+@app.get("/lists/overdue", response_model=List[ListTaskResponse])
+async def overdue_in_lists(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    """Unfinished tasks due before today across every list, earliest first."""
+    today = date.today().isoformat()
+    found = await fan_out(lambda m: [t.to_dict() for t in m.overdue(today, limit=limit)])
+    rows = [{**task, "list_id": list_id} for list_id, tasks in found.items() for task in tasks]
+    rows.sort(key=lambda row: (row["due_date"], row["list_id"], row["id"]))
+    return json_response(request, dumps(rows[:limit]))
+
+@app.get("/lists/search/{keyword}", response_model=List[ListTaskResponse])
+async def search_lists(request: Request, keyword: str, limit: Optional[int] = Query(None, ge=1),
+                       mode: Literal["index", "substring"] = "index"):
+    """Search every list; hits are grouped by list (in list order), each list's ranked as in its own search."""
+    found = await fan_out(lambda m: [t.to_dict() for t in m.search(keyword, limit=limit, mode=mode)])
+    rows = [{**task, "list_id": list_id} for list_id, tasks in found.items() for task in tasks]
+    return json_response(request, dumps(rows[:limit]))
+
+@app.get("/lists/{list_id}/tasks", response_model=List[TaskResponse], responses=PAGE_HEADERS)
+async def get_list_tasks(
+    request: Request,
+    list_id: str = LIST_ID_PATH,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    after_due: Optional[str] = AFTER_DUE,
+    status: Optional[str] = None,
+    due_before: Optional[date] = None,
+    due_after: Optional[date] = None,
+    overdue: bool = False,
+    sort: Literal["id", "-id", "due_date", "-due_date"] = "id",
+):
+    async with open_list(list_id) as entry:
+        return held_until_sent(await query_response(request, entry.manager, limit, after_id, after_due, status,
+                                                    due_before, due_after, overdue, sort), entry)
+
+@app.post("/lists/{list_id}/tasks", response_model=TaskResponse)
+async def create_list_task(task_data: TaskCreate, list_id: str = LIST_ID_PATH):
+    """Add a task to the list, creating the list if it is new."""
+    async with open_list(list_id, create=True) as entry:
+        task = await entry.committer.submit(entry.manager.add_task, title=task_data.title,
+                                            description=task_data.description, due_date=task_data.due_date)
+        return TaskResponse.from_task(task)
+
+@app.get("/lists/{list_id}/tasks/{task_id}", response_model=TaskResponse)
+async def get_list_task(request: Request, task_id: int, list_id: str = LIST_ID_PATH):
+    async with open_list(list_id) as entry:
+        return await task_response(request, entry.manager, task_id)
+
+@app.put("/lists/{list_id}/tasks/{task_id}", response_model=TaskResponse)
+async def update_list_task(task_id: int, task_data: TaskUpdate, list_id: str = LIST_ID_PATH):
+    async with open_list(list_id) as entry:
+        return await apply_update(entry.manager, entry.committer.submit, task_id, task_data)
+
+@app.patch("/lists/{list_id}/tasks/{task_id}/complete", response_model=TaskResponse)
+async def complete_list_task(task_id: int, list_id: str = LIST_ID_PATH):
+    async with open_list(list_id) as entry:
+        return await apply_complete(entry.manager, entry.committer.submit, task_id)
+
+@app.delete("/lists/{list_id}/tasks/{task_id}")
+async def delete_list_task(task_id: int, list_id: str = LIST_ID_PATH):
+    async with open_list(list_id) as entry:
+        return await apply_delete(entry.manager, entry.committer.submit, task_id)
+
+@app.get("/changes", response_model=ChangesResponse, responses={410: {"model": ResyncResponse}})
+async def get_changes(request: Request, since: Optional[int] = Query(None, ge=0),
+                      limit: int = Query(CHANGES_PAGE, ge=1, le=MAX_BATCH_SIZE)):
+    """Creates, updates, completions and deletes after sequence number ``since``, oldest first.
+
+    Without ``since`` this just returns the current sequence number. Answers
+    410 with the number to restart from when ``since`` is older than the
+    retained log: refetch ``GET /tasks``, then continue from there.
+    """
+    try:
+        body = await run_in_threadpool(read_changes, since, limit)
+    except ResyncRequired as e:
+        return json_response(request, dumps({"detail": str(e), "seq": e.seq}), status_code=410)
+    return json_response(request, dumps(body))
+
+@app.get("/changes/stream", response_class=StreamingResponse,
+         responses={200: {"content": {"text/event-stream": {}}, "description": "Server-sent events"}})
+async def stream_changes(request: Request, since: Optional[int] = Query(None, ge=0)):
+    """Push changes as Server-Sent Events, starting after ``since`` (or the ``Last-Event-ID`` header).
+
+    Each ``changes`` event carries a ChangesResponse and has the sequence
+    number as its id, so a reconnecting EventSource resumes where it left off.
+    A ``resync`` event (data ``{"seq": n}``) means changes were missed: refetch
+    the tasks; the stream carries on from ``n``.
+    """
+    last_id = request.headers.get("last-event-id")
+    if since is None and last_id and last_id.isdigit():
+        since = int(last_id)
+
+    async def events():
+        seq = since
+        if seq is None:
+            seq = (await run_in_threadpool(read_changes, None, 1))["seq"]
+        while True:
+            try:
+                body = await run_in_threadpool(read_changes, seq, CHANGES_PAGE)
+            except ResyncRequired as e:
+                seq = e.seq
+                yield f"event: resync\ndata: {dumps({'seq': seq}).decode()}\n\n"
+                continue
+            seq = body["seq"]
+            if body["changes"]:
+                yield f"id: {seq}\nevent: changes\ndata: {dumps(body).decode()}\n\n"
+            if body["more"]:
+                continue
+            if not await change_feed.wait(seq, KEEPALIVE_SECONDS):
+                # Idle: keep proxies from closing the connection; the next read picks up other processes' writes.
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
-        "total_tasks": len(task_manager.get_all()),
+        "total_tasks": len(task_manager),
         "api_version": "1.0.0"
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, TaskManager and store metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Run the server locally only
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))  
@@ -0,0 +1,62 @@
+"""Seeded synthetic task datasets.
+
+The same ``seed`` and size always produce the same tasks, so runs on
+different machines or commits measure identical data.
+
+    python -m benchmarks.data --tasks 100000 --backend sqlite --path /tmp/bench.db
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+from storage import make_storage, DEFAULT_PATHS
+from tasks import Task
+
+SIZES = (1000, 10000, 100000, 1000000)
+# Due dates and created_at are spread around a fixed day so datasets don't depend on the run date.
+ANCHOR = date(2025, 1, 1)
+WORDS = ("report budget review meeting client design deploy invoice release plan sprint backlog "
+         "email call draft update fix test refactor migrate audit schedule hire onboard train "
+         "research prototype launch feedback survey roadmap database server backup monitor alert").split()
+
+def generate(n, seed=0):
+    """Yield ``n`` task dicts with ids 1..n."""
+    rng = random.Random(seed)
+    created = datetime.combine(ANCHOR, datetime.min.time()) - timedelta(days=365)
+    for i in range(1, n + 1):
+        due = ANCHOR + timedelta(days=rng.randrange(-180, 180)) if rng.random() < 0.7 else None
+        words = rng.randrange(0, 12)
+        yield {
+            "id": i,
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 5))),
+            "description": " ".join(rng.choice(WORDS) for _ in range(words)),
+            "due_date": due.isoformat() if due else None,
+            "status": "Completed" if rng.random() < 0.3 else "Pending",
+            "created_at": (created + timedelta(seconds=rng.randrange(365 * 86400),
+                                               microseconds=rng.randrange(1, 10 ** 6))).isoformat(),
+        }
+
+def write_store(path, n, backend="json", seed=0):
+    """Write a dataset of ``n`` tasks to a ``backend`` store at ``path``."""
+    storage = make_storage(backend, path)
+    try:
+        if backend in ("journal", "binary"):
+            # Log-backed stores start as a bare snapshot with an empty log.
+            storage._write_snapshot(list(generate(n, seed)), {})
+        else:
+            storage.save([Task.from_dict(d) for d in generate(n, seed)])
+    finally:
+        storage.close()
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=SIZES[0])
+    parser.add_argument("--backend", choices=("json", "journal", "sqlite", "binary"), default="json")
+    parser.add_argument("--path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(write_store(args.path or DEFAULT_PATHS[args.backend], args.tasks, args.backend, args.seed))
+
+if __name__ == "__main__":
+    main()
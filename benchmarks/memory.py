@@ -0,0 +1,62 @@
+"""Bytes per task for the in-memory Task representation.
+
+Compares the original ``@dataclass`` Task (kept here as ``LegacyTask``) with
+the current slotted one. Each run parses the same JSON the way
+``JSONStorage.load`` does and measures what is still allocated once only the
+task objects remain.
+
+    python -m benchmarks.memory --tasks 100000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Optional
+
+from benchmarks.data import generate
+from tasks import Task
+
+@dataclass
+class LegacyTask:
+    id: int
+    title: str
+    description: str = ""
+    due_date: Optional[str] = None
+    status: str = "Pending"
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+
+    def to_dict(self):
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(d):
+        return LegacyTask(**d)
+
+def bytes_per_task(cls, blob, n):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tasks = [cls.from_dict(d) for d in json.loads(blob)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del tasks
+    return used / n
+
+def run(n):
+    blob = json.dumps(list(generate(n))).encode()
+    before = bytes_per_task(LegacyTask, blob, n)
+    after = bytes_per_task(Task, blob, n)
+    return {"tasks": n, "legacy_bytes_per_task": round(before), "bytes_per_task": round(after),
+            "saved": f"{1 - after / before:.0%}"}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=100000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.tasks)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Benchmarks for TaskManager operations, startup and the API.
+
+Every dataset comes from ``benchmarks.data`` with a fixed seed. Results are
+written as JSON keyed ``<backend>/<tasks>/<operation>`` with per-operation
+latency stats; ``--compare`` checks them against a stored run and exits
+non-zero when an operation got slower than ``--threshold`` allows.
+
+    python -m benchmarks.suite --sizes 1000,10000 --backends json,sqlite --out baseline.json
+    python -m benchmarks.suite --sizes 1000,10000 --backends json,sqlite --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.data import ANCHOR, WORDS, write_store
+from storage import make_storage
+from tasks import TaskManager
+
+EXTENSIONS = {"json": ".json", "journal": ".json", "sqlite": ".db", "binary": ".bin"}
+
+def timed(fn, args):
+    """Call ``fn(arg)`` for each of ``args``; return each call's duration in seconds."""
+    samples = []
+    clock = time.perf_counter
+    for arg in args:
+        start = clock()
+        fn(arg)
+        samples.append(clock() - start)
+    return samples
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def stats(samples):
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "mean_us": round(total / len(ordered) * 1e6, 2),
+        "p50_us": round(percentile(ordered, 0.50) * 1e6, 2),
+        "p99_us": round(percentile(ordered, 0.99) * 1e6, 2),
+        "ops_per_sec": round(len(ordered) / total, 1) if total else None,
+    }
+
+def throughput(fn, repeat):
+    """Call ``fn()``, which returns a byte count, ``repeat`` times; latency stats plus CPU per call and bytes/s."""
+    sizes = []
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    samples = timed(lambda _: sizes.append(fn()), range(repeat))
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    result = stats(samples)
+    result["cpu_us"] = round(cpu / repeat * 1e6, 2)
+    result["bytes"] = sizes[-1]
+    result["bytes_per_sec"] = round(sum(sizes) / wall)
+    return result
+
+def open_store(backend, path):
+    return TaskManager(filepath=path, storage=make_storage(backend, path))
+
+def bench_manager(backend, n, workdir, seed=0, repeat=1000, slow=3, writes=20):
+    """Microbenchmarks for each TaskManager operation on an ``n``-task store."""
+    path = write_store(os.path.join(workdir, f"{backend}-{n}{EXTENSIONS[backend]}"), n, backend, seed)
+    rng = random.Random(seed)
+    ids = [rng.randint(1, n) for _ in range(repeat)]
+    words = [rng.choice(WORDS)[:rng.randint(2, 5)] for _ in range(repeat)]
+    days = [(ANCHOR + timedelta(days=rng.randrange(-180, 180))).isoformat() for _ in range(repeat)]
+    results = {}
+    results["load"] = stats(timed(lambda _: open_store(backend, path).close(), range(slow)))
+
+    def cold_start(_):
+        # Startup as the CLI/GUI see it: open the store, then show a first page and one task.
+        mgr = open_store(backend, path)
+        mgr.query(limit=50)
+        mgr.find(n // 2)
+        mgr.close()
+    results["cold_start"] = stats(timed(cold_start, range(slow)))
+    mgr = open_store(backend, path)
+    try:
+        results["find"] = stats(timed(mgr.find, ids))
+        results["get_all"] = stats(timed(lambda _: mgr.get_all(), range(slow)))
+        results["query_page"] = stats(timed(lambda i: mgr.query(after_id=i, limit=50), ids))
+        results["query_status_due"] = stats(timed(
+            lambda d: mgr.query(status="Pending", due_after=d, sort="due_date", limit=50), days))
+        results["overdue"] = stats(timed(lambda d: mgr.overdue(d, limit=50), days))
+        results["upcoming"] = stats(timed(lambda d: mgr.upcoming(7, d, limit=50), days))
+        results["search_first"] = stats(timed(lambda w: mgr.search(w, limit=20), words[:1]))
+        results["search"] = stats(timed(lambda w: mgr.search(w, limit=20), words))
+        results["search_substring"] = stats(timed(lambda w: mgr.search(w, mode="substring"), words[:slow]))
+        added = []
+        seq = mgr.changes.seq
+        results["add_task"] = stats(timed(
+            lambda i: added.append(mgr.add_task(f"bench {i}", "added by benchmark", days[i % repeat]).id), range(writes)))
+        results["update"] = stats(timed(lambda i: mgr.update(i, description="updated"), added))
+        results["mark_complete"] = stats(timed(mgr.mark_complete, added))
+        results["delete"] = stats(timed(mgr.delete, added))
+        # Delta sync after the writes above: proportional to the changes, not the store.
+        results["changes_since"] = stats(timed(lambda _: mgr.changes.since(seq), range(repeat)))
+        items = [{"title": f"bulk {i}", "due_date": days[i % repeat]} for i in range(1000)]
+        results["add_many_1000"] = stats(timed(lambda _: mgr.add_many(items), range(slow)))
+        results["save"] = stats(timed(lambda _: mgr.save(), range(slow)))
+        results["export_ndjson"] = stats(timed(lambda _: sum(1 for _ in mgr.export_ndjson()), range(slow)))
+    finally:
+        mgr.close()
+    return {f"{backend}/{n}/{name}": value for name, value in results.items()}
+
+def bench_api(backend, n, workdir, seed=0, requests=2000, read_ratio=0.8):
+    """Mixed read/write load through FastAPI's TestClient against an ``n``-task store.
+
+    ``api`` builds its manager at import time from ``TASKS_BACKEND`` and
+    ``TASKS_PATH``, so this can run once per process.
+    """
+    if "api" in sys.modules:
+        raise RuntimeError("the API benchmark must run before anything imports api")
+    path = write_store(os.path.join(workdir, f"api-{backend}-{n}{EXTENSIONS[backend]}"), n, backend, seed)
+    os.environ["TASKS_BACKEND"], os.environ["TASKS_PATH"] = backend, path
+    from fastapi.testclient import TestClient
+    start = time.perf_counter()
+    import api
+    samples = {}
+    with TestClient(api.app) as client:
+        results = {"startup": stats([time.perf_counter() - start])}
+        results.update(bench_list(api, client))
+        rng = random.Random(seed)
+        reads = [
+            ("GET /tasks", lambda: client.get("/tasks", params={"limit": 50, "after_id": rng.randint(0, n)})),
+            ("GET /tasks/{id}", lambda: client.get(f"/tasks/{rng.randint(1, n)}")),
+            ("GET /tasks/search", lambda: client.get(f"/tasks/search/{rng.choice(WORDS)}", params={"limit": 20})),
+            ("GET /tasks/upcoming", lambda: client.get("/tasks/upcoming", params={"days": rng.randint(1, 30)})),
+        ]
+        writes = [
+            ("POST /tasks", lambda: client.post("/tasks", json={"title": "api bench", "due_date": ANCHOR.isoformat()})),
+            ("PUT /tasks/{id}", lambda: client.put(f"/tasks/{rng.randint(1, n)}", json={"description": "edited"})),
+            ("PATCH /tasks/{id}/complete", lambda: client.patch(f"/tasks/{rng.randint(1, n)}/complete")),
+        ]
+        wall = time.perf_counter()
+        for _ in range(requests):
+            name, call = rng.choice(reads if rng.random() < read_ratio else writes)
+            t0 = time.perf_counter()
+            response = call()
+            samples.setdefault(name, []).append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        wall = time.perf_counter() - wall
+    for name, values in samples.items():
+        results[name] = stats(values)
+    results["mixed"] = stats([s for values in samples.values() for s in values])
+    results["mixed"]["ops_per_sec"] = round(requests / wall, 1)
+    return {f"api/{backend}/{n}/{name}": value for name, value in results.items()}
+
+def bench_list(api, client, repeat=20):
+    """Serve the whole store as one list, the old pydantic way and the fast way.
+
+    ``pydantic`` is the previous path (a TaskResponse per task, validated and
+    dumped as a list); ``fast``, ``fast_gzip`` and ``stream`` are the encoders
+    the API now uses. The ``GET /tasks`` rows go through the app with the
+    response cache cleared before each request, except ``cached``. Each row
+    has CPU time per request and bytes (on the wire) per second.
+    """
+    from typing import List
+    from pydantic import TypeAdapter
+    import encoding
+    tasks = api.task_manager.get_all()
+    adapter = TypeAdapter(List[api.TaskResponse])
+
+    def get(encoding_header, clear=True):
+        if clear:
+            api.response_cache.clear()
+        response = client.get("/tasks", headers={"accept-encoding": encoding_header})
+        return response.num_bytes_downloaded
+
+    rows = {
+        "pydantic": lambda: len(adapter.dump_json(adapter.validate_python(
+            [api.TaskResponse.from_task(t) for t in tasks]))),
+        "fast": lambda: len(encoding.encode_tasks(tasks)),
+        "fast_gzip": lambda: len(encoding.gzip_body(encoding.encode_tasks(tasks))),
+        "stream": lambda: sum(map(len, encoding.iter_encode_tasks(tasks, api.task_manager.lock))),
+        "GET /tasks": lambda: get("identity"),
+        "GET /tasks gzip": lambda: get("gzip"),
+        "GET /tasks cached": lambda: get("identity", clear=False),
+        "GET /tasks cached gzip": lambda: get("gzip", clear=False),
+    }
+    return {f"list_{len(tasks)}/{name}": throughput(fn, repeat) for name, fn in rows.items()}
+
+def compare(baseline, current, threshold=0.2, metric="p50_us"):
+    """Return ``(name, before, after, change)`` rows for every operation in both runs, and the regressions."""
+    rows, regressions = [], []
+    for name, value in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old or not old.get(metric) or value.get(metric) is None:
+            continue
+        change = value[metric] / old[metric] - 1
+        rows.append((name, old[metric], value[metric], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated dataset sizes")
+    parser.add_argument("--backends", default="json,journal,sqlite,binary")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1000, help="calls per fast read operation")
+    parser.add_argument("--slow-repeat", type=int, default=3, help="calls per full-scan operation")
+    parser.add_argument("--writes", type=int, default=20, help="calls per single-task mutation")
+    parser.add_argument("--api", action="store_true", help="also run the API load test")
+    parser.add_argument("--api-tasks", type=int, default=10000)
+    parser.add_argument("--api-backend", default="json")
+    parser.add_argument("--api-requests", type=int, default=2000)
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--metric", default="p50_us", choices=("p50_us", "mean_us", "p99_us"))
+    args = parser.parse_args(argv)
+
+    run = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.api:
+            run["results"].update(bench_api(args.api_backend, args.api_tasks, workdir, args.seed,
+                                             args.api_requests, args.read_ratio))
+        for n in (int(s) for s in args.sizes.split(",")):
+            for backend in args.backends.split(","):
+                print(f"{backend} {n}...", file=sys.stderr)
+                run["results"].update(bench_manager(backend, n, workdir, args.seed,
+                                                    args.repeat, args.slow_repeat, args.writes))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(run, f, indent=2)
+    else:
+        print(json.dumps(run, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, run, args.threshold, args.metric)
+        for name, before, after, change in rows:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<50} {before:>12.1f} {after:>12.1f} {change:>+8.0%}{flag}", file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
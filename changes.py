@@ -0,0 +1,127 @@
+import asyncio
+import bisect
+import threading
+from operator import itemgetter
+
+RETENTION = 10000
+
+class ResyncRequired(Exception):
+    """The requested changes are no longer (or were never) in the log; refetch everything.
+
+    ``seq`` is the log's current sequence number, to resume from afterwards.
+    """
+
+    def __init__(self, seq):
+        super().__init__(f"changes are only kept back to a later sequence number; resync from {seq}")
+        self.seq = seq
+
+class ChangeLog:
+    """Bounded, ordered log of task changes.
+
+    A change is ``(seq, op, task_id, task)`` where ``op`` is create, update,
+    complete or delete, ``task`` the task's dict (None for deletes) and
+    ``seq`` the store version of the commit that made it, so one commit's
+    changes share a number. Only the newest ``retention`` changes (plus up to
+    a quarter more between trims) are kept; ``since(seq)`` raises
+    ResyncRequired when changes after ``seq`` may have been dropped. The log
+    has its own lock, as commits append to it after releasing the manager's.
+    """
+
+    def __init__(self, retention=RETENTION, seq=0):
+        self.retention = retention
+        self.seq = seq
+        # Changes at or before this seq may be missing from the log.
+        self.floor = seq
+        self.listeners = []
+        self._changes = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._changes)
+
+    def reset(self, seq):
+        """Forget everything (the store was reloaded wholesale); readers behind ``seq`` must resync."""
+        with self._lock:
+            self._changes = []
+            self.seq = self.floor = seq
+        self._notify()
+
+    def extend(self, seq, changes):
+        """Append ``(op, task_id, task)`` changes made by the commit numbered ``seq``."""
+        with self._lock:
+            self._changes.extend((seq, op, task_id, task) for op, task_id, task in changes)
+            self.seq = max(self.seq, seq)
+            excess = len(self._changes) - self.retention
+            # Trim in slices of a quarter of the retention so appends stay amortized O(1).
+            if excess > 0 and excess >= self.retention // 4:
+                self.floor = self._changes[excess - 1][0]
+                del self._changes[:excess]
+        self._notify()
+
+    def since(self, seq, limit=None):
+        """Changes after ``seq`` in order, and the seq they bring a reader up to.
+
+        With ``limit``, whole commits are returned until the limit is reached
+        (a single commit larger than the limit is returned in full).
+        """
+        with self._lock:
+            changes = self._changes
+            if seq < self.floor or seq > self.seq:
+                raise ResyncRequired(self.seq)
+            start = bisect.bisect_right(changes, seq, key=itemgetter(0))
+            end = len(changes)
+            if limit is not None and end - start > limit:
+                end = start + limit
+                last = changes[end - 1][0]
+                if changes[end][0] == last:
+                    # Don't split a commit: stop before it, or take it whole if it is the first.
+                    cut = bisect.bisect_left(changes, last, start, end, key=itemgetter(0))
+                    end = cut if cut > start else bisect.bisect_right(changes, last, end, key=itemgetter(0))
+                return changes[start:end], changes[end - 1][0]
+            return changes[start:end], self.seq
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener(self.seq)
+
+class ChangeFeed:
+    """Lets asyncio tasks wait for a ChangeLog to move past a sequence number.
+
+    Commits happen on other threads; each one wakes every waiter through the
+    event loop, so any number of subscribers cost one callback per commit.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self._loop = None
+        self._event = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self.log.listeners.append(self._changed)
+
+    def stop(self):
+        if self._changed in self.log.listeners:
+            self.log.listeners.remove(self._changed)
+
+    def _changed(self, seq):
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass  # the event loop has closed
+
+    def _wake(self):
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, seq, timeout=None):
+        """Wait until the log is past ``seq`` (or was reset); False if ``timeout`` seconds pass first."""
+        event = self._event
+        if self.log.seq != seq:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
@@ -1,7 +1,35 @@
-from tasks import TaskManager
+import argparse
+import json
+import re
+import shlex
+import sys
+import time
+from itertools import islice
+from tasks import SORTS, open_manager
 from datetime import datetime
 
 DATE_FORMAT = "%Y-%m-%d"
+FORMATS = ("table", "json", "ndjson")
+# Positional arguments of each task command, in order; JSON batch lines pass everything else as options.
+COMMANDS = {
+    "add": ("title",),
+    "list": (),
+    "complete": ("id",),
+    "delete": ("id",),
+    "search": ("keyword",),
+    "update": ("id",),
+}
+# A whole word: bare, or in single or double quotes with no escapes. Anything else goes to shlex.
+WORD = re.compile(r"""'([^']*)'(?=\s|$)|"([^"\\]*)"(?=\s|$)|([^\s"'\\]+)(?=\s|$)""")
+
+class CommandError(ValueError):
+    pass
+
+class CommandParser(argparse.ArgumentParser):
+    """Raises instead of exiting, so one bad line doesn't end a batch."""
+
+    def error(self, message):
+        raise CommandError(message)
 
 def input_date(prompt):
     s = input(prompt).strip()
@@ -14,7 +42,14 @@ def input_date(prompt):
         print("Invalid date format. Use YYYY-MM-DD.")
         return input_date(prompt)
 
+class TaskRow:
+    """A task dict as print_tasks expects it."""
+
+    def __init__(self, id, title, description, due_date, status, created_at):
+        self.id, self.title, self.due_date, self.status = id, title, due_date, status
+
 def print_tasks(tasks):
+    tasks = list(tasks)
     if not tasks:
         print("No tasks.")
         return
@@ -24,9 +59,204 @@ def print_tasks(tasks):
         due = t.due_date or "-"
         print(f"{t.id:<4} {t.title[:28]:<30} {due:<12} {t.status:<10}")
 
-def main():
-    mgr = TaskManager()
+def count(s):
+    try:
+        n = int(s)
+    except ValueError:
+        n = -1
+    if n < 0:
+        raise argparse.ArgumentTypeError("use a whole number, 0 or more")
+    return n
+
+def due_date(s):
+    try:
+        datetime.strptime(s, DATE_FORMAT)
+    except ValueError:
+        raise argparse.ArgumentTypeError("use YYYY-MM-DD")
+    return s
+
+def add_task_commands(sub):
+    """Add the add/list/complete/delete/search/update subcommands to ``sub``."""
+    p = sub.add_parser("add", help="add a task")
+    p.add_argument("title")
+    p.add_argument("--description", default="")
+    p.add_argument("--due", type=due_date)
+    p = sub.add_parser("list", help="list tasks")
+    p.add_argument("--status")
+    p.add_argument("--due-before", type=due_date)
+    p.add_argument("--due-after", type=due_date)
+    p.add_argument("--overdue", action="store_true")
+    p.add_argument("--sort", choices=SORTS, default="id")
+    p.add_argument("--after-id", type=int)
+    p.add_argument("--after-due", help="with a due-date sort, the due date of the --after-id task ('' for none)")
+    p.add_argument("--limit", type=count)
+    p = sub.add_parser("complete", help="mark a task complete")
+    p.add_argument("id", type=int)
+    p = sub.add_parser("delete", help="delete a task")
+    p.add_argument("id", type=int)
+    p = sub.add_parser("search", help="search titles and descriptions")
+    p.add_argument("keyword")
+    p.add_argument("--limit", type=count)
+    p.add_argument("--substring", action="store_true", help="plain substring match instead of the index")
+    p = sub.add_parser("update", help="change a task's title, description or due date")
+    p.add_argument("id", type=int)
+    p.add_argument("--title")
+    p.add_argument("--description")
+    p.add_argument("--due", type=due_date)
+
+def run_command(mgr, args):
+    """Apply one parsed task command; returns a JSON-ready result with ``ok`` and ``task`` or ``tasks``."""
+    if args.command == "add":
+        return {"ok": True, "task": mgr.add_task(args.title, args.description, args.due).to_dict()}
+    if args.command == "list":
+        tasks = mgr.query(status=args.status, due_before=args.due_before, due_after=args.due_after,
+                          overdue=args.overdue, sort=args.sort, after_id=args.after_id,
+                          after_due=args.after_due, limit=args.limit)
+        return {"ok": True, "tasks": [t.to_dict() for t in tasks]}
+    if args.command == "search":
+        tasks = mgr.search(args.keyword, limit=args.limit, mode="substring" if args.substring else "index")
+        return {"ok": True, "tasks": [t.to_dict() for t in tasks]}
+    if args.command == "complete":
+        found = mgr.mark_complete(args.id)
+    elif args.command == "delete":
+        found = mgr.delete(args.id)
+    else:
+        found = mgr.update(args.id, args.title, args.description, args.due)
+    if not found:
+        return {"ok": False, "id": args.id, "error": "not found"}
+    task = mgr.find(args.id)
+    return {"ok": True, "id": args.id, "task": task.to_dict()} if task else {"ok": True, "id": args.id}
+
+def print_result(command, result, fmt, out=sys.stdout):
+    if fmt == "json":
+        out.write(json.dumps(result) + "\n")
+    elif fmt == "ndjson":
+        rows = result["tasks"] if "tasks" in result else [result]
+        out.writelines(json.dumps(row) + "\n" for row in rows)
+    elif "tasks" in result:
+        print_tasks(TaskRow(**t) for t in result["tasks"])
+    elif not result["ok"]:
+        print("Not found.", file=out)
+    elif command == "add":
+        print("Added task id:", result["task"]["id"], file=out)
+    else:
+        print({"complete": "Marked complete.", "delete": "Deleted.", "update": "Updated."}[command], file=out)
+
+def command_parsers():
+    """The task subcommand parsers by name, raising CommandError on bad input."""
+    sub = CommandParser(prog="batch", add_help=False).add_subparsers(parser_class=CommandParser)
+    add_task_commands(sub)
+    return sub.choices
+
+def split_line(line):
+    """``shlex.split`` with a fast path for the common case of plainly quoted words."""
+    argv = []
+    pos = 0
+    for m in WORD.finditer(line):
+        if line[pos:m.start()].strip():
+            return shlex.split(line)
+        single, double, bare = m.groups()
+        argv.append(bare if bare is not None else double if double is not None else single)
+        pos = m.end()
+    if line[pos:].strip():
+        return shlex.split(line)
+    return argv
+
+def parse_line(parsers, line):
+    """Parse a batch line: a command as typed on the command line, or a JSON object with an ``op`` key."""
+    if not line.startswith("{"):
+        command, *argv = split_line(line)
+    else:
+        fields = json.loads(line)
+        command = fields.pop("op", None)
+        if command not in COMMANDS:
+            raise CommandError(f"unknown op {command!r}")
+        argv = []
+        for name in COMMANDS[command]:
+            value = fields.pop(name, None)
+            if value is None:
+                raise CommandError(f"{command} needs {name!r}")
+            argv.append(str(value))
+        for key, value in fields.items():
+            option = "--" + key.replace("_", "-")
+            if value is True:
+                argv.append(option)
+            elif value is not None and value is not False:
+                argv += [option, str(value)]
+    if command not in parsers:
+        raise CommandError(f"unknown command {command!r}")
+    return parsers[command].parse_args(argv, argparse.Namespace(command=command))
+
+def run_batch(mgr, lines, every=0, out=sys.stdout, quiet=False):
+    """Apply a stream of commands, committing once at the end or after every ``every`` commands.
+
+    Writes one NDJSON result per command (only failures when ``quiet``) and
+    returns ``{"commands": n, "failed": n}``.
+    """
+    parsers = command_parsers()
+    stats = {"commands": 0, "failed": 0}
+    numbered = enumerate(lines, 1)
+    while True:
+        chunk = list(islice(numbered, every)) if every else numbered
+        with mgr.batch():
+            for number, line in chunk:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    result = run_command(mgr, parse_line(parsers, line))
+                except (ValueError, TypeError) as e:
+                    result = {"ok": False, "error": str(e)}
+                stats["commands"] += 1
+                if not result["ok"]:
+                    stats["failed"] += 1
+                if not quiet or not result["ok"]:
+                    out.write(json.dumps({"line": number, **result}) + "\n")
+        if not every or not chunk:
+            return stats
+
+def batch_command(mgr, path, every, quiet):
+    start = time.perf_counter()
+    src = sys.stdin if path == "-" else open(path)
+    try:
+        stats = run_batch(mgr, src, every, quiet=quiet)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    seconds = time.perf_counter() - start
+    print(f"Applied {stats['commands']} commands ({stats['failed']} failed) in {seconds:.2f}s", file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+def export_tasks(mgr, path):
+    start = time.perf_counter()
+    out = sys.stdout if path == "-" else open(path, "w")
+    count = 0
+    try:
+        for line in mgr.export_ndjson():
+            out.write(line)
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    print(f"Exported {count} tasks in {seconds:.2f}s ({count / seconds if seconds else 0:.0f} tasks/s)",
+          file=sys.stderr)
+
+def import_tasks(mgr, path, chunk_size):
+    src = sys.stdin if path == "-" else open(path)
+    try:
+        stats = mgr.import_ndjson(src, chunk_size=chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    for err in stats["errors"]:
+        print(err, file=sys.stderr)
+    print(json.dumps(stats))
+    return 1 if stats["failed"] else 0
+
+def interactive(mgr):
     while True:
+        mgr.sync()
         print("\n1) Add  2) View  3) Complete  4) Delete  5) Search  6) Edit  7) Quit")
         choice = input("Choose: ").strip()
         if choice=="1":
@@ -83,5 +313,40 @@ def main():
         else:
             print("Invalid choice.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Task manager. Run without a command for the interactive menu.")
+    parser.add_argument("--format", choices=FORMATS, default="table", help="output of the task commands")
+    sub = parser.add_subparsers(dest="command")
+    add_task_commands(sub)
+    p = sub.add_parser("batch", help="apply commands from a file or stdin, one per line")
+    p.add_argument("file", nargs="?", default="-", help="command file (default: stdin)")
+    p.add_argument("--every", type=count, default=0, metavar="N",
+                   help="commit after every N commands (default: once at the end)")
+    p.add_argument("--quiet", action="store_true", help="only report failed commands")
+    p = sub.add_parser("export", help="write all tasks as NDJSON")
+    p.add_argument("file", nargs="?", default="-", help="output file (default: stdout)")
+    p = sub.add_parser("import", help="load tasks from NDJSON")
+    p.add_argument("file", nargs="?", default="-", help="input file (default: stdin)")
+    p.add_argument("--chunk-size", type=int, default=1000, help="tasks per commit")
+    args = parser.parse_args(argv)
+
+    mgr = open_manager()
+    if args.command == "export":
+        export_tasks(mgr, args.file)
+    elif args.command == "import":
+        return import_tasks(mgr, args.file, args.chunk_size)
+    elif args.command == "batch":
+        return batch_command(mgr, args.file, args.every, args.quiet)
+    elif args.command in COMMANDS:
+        try:
+            result = run_command(mgr, args)
+        except ValueError as e:
+            parser.error(str(e))
+        print_result(args.command, result, args.format)
+        return 0 if result["ok"] else 1
+    else:
+        interactive(mgr)
+    return 0
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
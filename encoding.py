@@ -0,0 +1,66 @@
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same bytes but about twice as slow
+    orjson = None
+
+CHUNK_SIZE = 1000  # tasks encoded per streamed chunk
+GZIP_LEVEL = 6         # bodies compressed once and cached
+STREAM_GZIP_LEVEL = 1  # streamed bodies are compressed on every request
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes for plain dicts, lists, strings and numbers."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+def encode_task(task):
+    """The JSON body of a TaskResponse, straight from the stored Task."""
+    return dumps(task.to_dict())
+
+def encode_tasks(tasks):
+    """The JSON body of a TaskResponse list, without building or validating pydantic models."""
+    return dumps([t.to_dict() for t in tasks])
+
+def iter_encode_tasks(tasks, lock, chunk_size=CHUNK_SIZE):
+    """Yield the JSON array of ``tasks`` in pieces of ``chunk_size`` tasks.
+
+    Each piece is encoded under ``lock`` so no task is read mid-update, but the
+    lock is released between pieces so writers aren't held up by a slow client.
+    """
+    for start in range(0, len(tasks), chunk_size):
+        with lock:
+            rows = [t.to_dict() for t in tasks[start:start + chunk_size]]
+        body = dumps(rows)
+        yield (b"[" if start == 0 else b",") + body[1:-1]
+    yield b"]" if tasks else b"[]"
+
+def accepts_gzip(header):
+    """Whether an Accept-Encoding header allows gzip, explicitly or through ``*`` (``q=0`` rules it out)."""
+    weights = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+def gzip_body(body, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+def gzip_stream(chunks, level=STREAM_GZIP_LEVEL):
+    """Gzip an iterable of byte chunks as one stream, yielding compressed data as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
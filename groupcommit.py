@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX = 1000
+
+class GroupCommitter:
+    """Serializes TaskManager mutations on one writer thread and commits them in groups.
+
+    ``submit`` queues a call and resolves once the storage commit that covers
+    it has finished, so a response is only sent for durable data. The writer
+    takes every call queued within ``window`` seconds of the first (up to
+    ``max_batch``), applies them under the manager's lock, then commits the
+    whole group with a single write outside the lock so readers are not held
+    up by the fsync.
+    """
+
+    def __init__(self, manager, window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX):
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    async def submit(self, fn, *args, **kwargs):
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((fn, args, kwargs, loop, future))
+        return await future
+
+    def _collect(self, first):
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = self._collect(first)
+            results = []
+            try:
+                with self.manager.batch():
+                    with self.manager.lock:
+                        for fn, args, kwargs, _, _ in group:
+                            try:
+                                results.append((True, fn(*args, **kwargs)))
+                            except Exception as e:
+                                results.append((False, e))
+            except Exception as e:
+                logger.exception("group commit of %d operation(s) failed", len(group))
+                results = [(False, e)] * len(group)
+            for (_, _, _, loop, future), (ok, value) in zip(group, results):
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, ok, value)
+                except RuntimeError:
+                    pass  # the caller's event loop has already closed
+
+def _resolve(future, ok, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
@@ -1,16 +1,33 @@
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
-from tasks import TaskManager
+from tasks import open_manager
 from datetime import datetime
 
 DATE_FORMAT = "%Y-%m-%d"
+CHUNK_SIZE = 500       # rows inserted per event-loop turn
+SEARCH_DELAY_MS = 250  # typing pause before a live search runs
+POLL_MS = 30           # how often to check for a finished background search
 
 class TaskApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Task Manager")
-        self.mgr = TaskManager()
+        self.mgr = open_manager()
+        # Row values currently in the tree, by iid; render() diffs against this.
+        self.shown = {}
+        self._render_job = None
+        # (index, task id) rows the running chunked render still has to insert.
+        self._pending_rows = []
+        self._query = ""
+        self._search_job = None
+        self._search_seq = 0
+        self._poll_job = None
+        self._results = queue.Queue()
+        self._searcher = ThreadPoolExecutor(max_workers=1)
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.refresh()
 
     def setup_ui(self):
@@ -19,6 +36,7 @@ class TaskApp:
 
         tk.Label(top, text="Search:").pack(side='left')
         self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_typed)
         tk.Entry(top, textvariable=self.search_var).pack(side='left', padx=4)
         tk.Button(top, text="Go", command=self.on_search).pack(side='left', padx=4)
         tk.Button(top, text="Clear", command=self.on_clear).pack(side='left')
@@ -39,25 +57,145 @@ class TaskApp:
 
         self.tree.bind("<Double-1>", self.view_details)
 
-    def refresh(self, tasks=None):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        tasks = tasks if tasks is not None else self.mgr.get_all()
-        for t in tasks:
-            due = t.due_date or "-"
-            self.tree.insert('', 'end', iid=str(t.id), values=(t.title, due, t.status))
+    @staticmethod
+    def row(t):
+        return (t.title, t.due_date or "-", t.status)
+
+    def refresh(self):
+        """Show every task (or the current search's hits), picking up other processes' changes."""
+        if self._query:
+            self.on_search()
+            return
+        self.mgr.sync()
+        with self.mgr.lock:
+            tasks = self.mgr.get_all()
+        self.render(tasks)
+
+    def render(self, tasks):
+        """Make the tree show ``tasks`` in order, touching only the rows that differ.
+
+        Stale rows are removed and changed rows updated at once; new rows are
+        inserted ``CHUNK_SIZE`` at a time from ``after()`` callbacks so a large
+        list never blocks the event loop. A newer render cancels the rest of an
+        older one.
+        """
+        if self._render_job is not None:
+            self.root.after_cancel(self._render_job)
+            self._render_job = None
+        wanted = {str(t.id): t for t in tasks}
+        stale = [iid for iid in self.shown if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.shown[iid]
+        for iid, t in wanted.items():
+            values = self.shown.get(iid)
+            if values is not None and values != self.row(t):
+                self.shown[iid] = self.row(t)
+                self.tree.item(iid, values=self.shown[iid])
+        kept = [iid for iid in wanted if iid in self.shown]
+        if list(self.tree.get_children()) != kept:
+            # Only kept rows can be out of order (e.g. a new search ranking), so move just those.
+            for index, iid in enumerate(kept):
+                self.tree.move(iid, '', index)
+        self._pending_rows = [(index, t.id) for index, (iid, t) in enumerate(wanted.items()) if iid not in self.shown]
+        self._insert_rows(self._pending_rows, 0)
+
+    def _insert_rows(self, missing, start):
+        end = start + CHUNK_SIZE
+        for index, task_id in missing[start:end]:
+            iid = str(task_id)
+            t = self.mgr.find(task_id)
+            if t is None or iid in self.shown:
+                continue  # deleted or already shown since this render was planned
+            self.shown[iid] = self.row(t)
+            # Appending is O(1) for Tk; a numeric index walks the children.
+            self.tree.insert('', 'end' if index >= len(self.shown) - 1 else index, iid=iid, values=self.shown[iid])
+        self._render_job = self.root.after(1, self._insert_rows, missing, end) if end < len(missing) else None
+
+    def apply(self, mutation, *args, **kwargs):
+        """Run a TaskManager mutation in a batch and under its lock (the search worker may be reading).
+
+        The batch takes the store lock first, the order every writer uses.
+        Returns the result and the store version from before the change.
+        """
+        with self.mgr.batch(), self.mgr.lock:
+            version = self.mgr.version
+            return mutation(*args, **kwargs), version
+
+    def changed(self, task_id, version):
+        """Update the view after this window changed ``task_id``; ``version`` is the store version before."""
+        if self._query or self.mgr.version != version + 1:
+            # A search is showing, or other processes changed the store as well: re-diff everything.
+            self.refresh()
+            return
+        iid = str(task_id)
+        t = self.mgr.find(task_id)
+        if t is None:
+            if iid in self.shown:
+                self.tree.delete(iid)
+                del self.shown[iid]
+        elif iid in self.shown:
+            self.shown[iid] = self.row(t)
+            self.tree.item(iid, values=self.shown[iid])
+        elif self._render_job is None:
+            self.shown[iid] = self.row(t)
+            self.tree.insert('', 'end', iid=iid, values=self.shown[iid])
+        else:
+            # A chunked render is still inserting rows: queue the new one after them.
+            self._pending_rows.append((len(self.mgr) - 1, task_id))
+
+    def on_search_typed(self, *args):
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DELAY_MS, self.on_search)
 
     def on_search(self):
-        k = self.search_var.get().strip()
-        if not k:
+        """Run the search on the worker thread; only the latest search's result is ever shown."""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+            self._search_job = None
+        self._query = self.search_var.get().strip()
+        self._search_seq += 1
+        if not self._query:
             self.refresh()
             return
-        res = self.mgr.search(k)
-        self.refresh(res)
+        self._searcher.submit(self._run_search, self._search_seq, self._query)
+        if self._poll_job is None:
+            self._poll_job = self.root.after(POLL_MS, self._poll_search)
+
+    def _run_search(self, seq, query):
+        if seq != self._search_seq:
+            return  # superseded while queued
+        try:
+            self.mgr.sync()
+            with self.mgr.lock:
+                hits = self.mgr.search(query)
+        except Exception as e:
+            hits = e
+        self._results.put((seq, hits))
+
+    def _poll_search(self):
+        self._poll_job = None
+        latest = None
+        while not self._results.empty():
+            latest = self._results.get_nowait()
+        if latest is not None and latest[0] == self._search_seq:
+            if isinstance(latest[1], Exception):
+                messagebox.showerror("Search", str(latest[1]))
+            else:
+                self.render(latest[1])
+        elif self._query:
+            self._poll_job = self.root.after(POLL_MS, self._poll_search)
 
     def on_clear(self):
         self.search_var.set("")
-        self.refresh()
+        self.on_search()
+
+    def on_close(self):
+        self._searcher.shutdown(wait=False, cancel_futures=True)
+        self.mgr.close()
+        self.root.destroy()
 
     def get_selected_id(self):
         sel = self.tree.selection()
@@ -111,11 +249,13 @@ class TaskApp:
                     messagebox.showwarning("Validation", "Due date must be YYYY-MM-DD")
                     return
             if task:
-                self.mgr.update(task.id, title=title, description=desc, due_date=due)
+                _, version = self.apply(self.mgr.update, task.id, title=title, description=desc, due_date=due)
+                task_id = task.id
             else:
-                self.mgr.add_task(title, description=desc, due_date=due)
+                new, version = self.apply(self.mgr.add_task, title, description=desc, due_date=due)
+                task_id = new.id
             win.destroy()
-            self.refresh()
+            self.changed(task_id, version)
 
         tk.Button(win, text="Save", command=save).grid(row=3,column=1,sticky='e', pady=6)
 
@@ -124,8 +264,8 @@ class TaskApp:
         if not sel:
             messagebox.showinfo("Select", "Select a task")
             return
-        self.mgr.mark_complete(sel)
-        self.refresh()
+        _, version = self.apply(self.mgr.mark_complete, sel)
+        self.changed(sel, version)
 
     def delete_task(self):
         sel = self.get_selected_id()
@@ -133,8 +273,8 @@ class TaskApp:
             messagebox.showinfo("Select", "Select a task")
             return
         if messagebox.askyesno("Confirm","Delete selected task?"):
-            self.mgr.delete(sel)
-            self.refresh()
+            _, version = self.apply(self.mgr.delete, sel)
+            self.changed(sel, version)
 
     def view_details(self, event):
         sel = self.get_selected_id()
@@ -0,0 +1,99 @@
+from bisect import bisect_left, bisect_right, insort
+
+LOAD = 1000
+
+class SortedKeys:
+    """A sorted collection of unique keys with O(log N) lookup and ordered range scans.
+
+    Keys are kept in sorted buckets of at most ``2 * LOAD`` plus a list of
+    each bucket's largest key, the layout sortedcontainers uses, so adding or
+    removing a key shifts one bucket rather than every key after it.
+    """
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._lists = [keys[i:i + LOAD] for i in range(0, len(keys), LOAD)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        sub = self._lists[i]
+        return sub[bisect_left(sub, key)] == key
+
+    def add(self, key):
+        lists, maxes = self._lists, self._maxes
+        self._len += 1
+        if not maxes:
+            lists.append([key])
+            maxes.append(key)
+            return
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            i -= 1
+            lists[i].append(key)
+            maxes[i] = key
+        else:
+            insort(lists[i], key)
+        sub = lists[i]
+        if len(sub) > 2 * LOAD:
+            lists[i:i + 1] = [sub[:LOAD], sub[LOAD:]]
+            maxes.insert(i, sub[LOAD - 1])
+
+    def remove(self, key):
+        lists, maxes = self._lists, self._maxes
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            return
+        sub = lists[i]
+        j = bisect_left(sub, key)
+        if sub[j] != key:
+            return
+        del sub[j]
+        self._len -= 1
+        # Shrinking buckets aren't merged; empty ones are dropped.
+        if sub:
+            maxes[i] = sub[-1]
+        else:
+            del lists[i], maxes[i]
+
+    def first(self):
+        return self._lists[0][0] if self._lists else None
+
+    def range(self, lo=None, hi=None, reverse=False):
+        """Yield keys with ``lo < key < hi`` (either bound may be None), in order."""
+        lists, maxes = self._lists, self._maxes
+        if not lists:
+            return
+        # From position j of bucket i up to (not including) position m of bucket k.
+        i, j = 0, 0
+        if lo is not None:
+            i = bisect_right(maxes, lo)
+            if i == len(maxes):
+                return
+            j = bisect_right(lists[i], lo)
+        k, m = len(lists) - 1, len(lists[-1])
+        if hi is not None:
+            k = bisect_left(maxes, hi)
+            if k == len(maxes):
+                k -= 1
+            else:
+                m = bisect_left(lists[k], hi)
+        if (i, j) >= (k, m):
+            return
+        buckets = range(k, i - 1, -1) if reverse else range(i, k + 1)
+        for b in buckets:
+            sub = lists[b]
+            start = j if b == i else 0
+            stop = m if b == k else len(sub)
+            if reverse:
+                for n in range(stop - 1, start - 1, -1):
+                    yield sub[n]
+            else:
+                for n in range(start, stop):
+                    yield sub[n]
@@ -0,0 +1,199 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from groupcommit import GroupCommitter
+from storage import DEFAULT_PATHS, make_storage
+from tasks import TaskManager
+
+LIST_ID = r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$"
+MAX_OPEN = 32
+# Rough resident size of one loaded task with its share of the id index (see benchmarks/memory.py).
+TASK_BYTES = 600
+
+class ListEntry:
+    """A loaded list: its manager, the committer that serializes its writes, and how many callers hold it."""
+
+    __slots__ = ("list_id", "manager", "committer", "users", "lock", "closed")
+
+    def __init__(self, list_id):
+        self.list_id = list_id
+        self.manager = None
+        self.committer = None
+        self.users = 0
+        self.lock = threading.Lock()
+        # Set once an evicted entry has been flushed and closed.
+        self.closed = threading.Event()
+
+class ManagerPool:
+    """TaskManagers for many task lists, each stored in its own shard file under ``root``.
+
+    Only recently used lists stay loaded: once more than ``max_open`` are
+    open, or their tasks are estimated at over ``max_bytes``, the least
+    recently used ones that nobody holds are evicted. Evicting drains the
+    list's committer, compacts its journal if it has changes and closes its
+    store, so nothing is lost and the next load is quick. ``map`` runs a
+    function over every list on a thread pool for cross-list queries.
+    """
+
+    def __init__(self, root, backend="json", max_open=MAX_OPEN, max_bytes=None, workers=8,
+                 commit_window=None):
+        if backend not in DEFAULT_PATHS:
+            raise ValueError(f"Unknown storage backend {backend!r}")
+        self.root = root
+        self.backend = backend
+        self.extension = os.path.splitext(DEFAULT_PATHS[backend])[1]
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.commit_window = commit_window
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # Evicted entries still being flushed; loading the same list again waits for them.
+        self._closing = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lists")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def path(self, list_id):
+        if not re.fullmatch(LIST_ID, list_id):
+            raise ValueError(f"Invalid list id {list_id!r}")
+        return os.path.join(self.root, list_id + self.extension)
+
+    def exists(self, list_id):
+        path = self.path(list_id)
+        # A journal shard may so far be only a log.
+        return (list_id in self._entries or list_id in self._closing
+                or os.path.exists(path) or os.path.exists(path + ".log"))
+
+    def list_ids(self):
+        """Every list, loaded or not, sorted."""
+        ids = set()
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else ():
+            name = name.removesuffix(".log")
+            if name.endswith(self.extension) and re.fullmatch(LIST_ID, name[:-len(self.extension)]):
+                ids.add(name[:-len(self.extension)])
+        with self._lock:
+            ids.update(self._entries)
+        return sorted(ids)
+
+    def estimated_bytes(self):
+        with self._lock:
+            return sum(len(e.manager) for e in self._entries.values() if e.manager is not None) * TASK_BYTES
+
+    def acquire(self, list_id, create=True):
+        """Load (or reuse) the list and hold it until ``release``; KeyError if it doesn't exist and not ``create``."""
+        path = self.path(list_id)
+        with self._lock:
+            entry = self._entries.get(list_id)
+            if entry is None:
+                if not create and not self.exists(list_id):
+                    raise KeyError(list_id)
+                os.makedirs(self.root, exist_ok=True)
+                entry = self._entries[list_id] = ListEntry(list_id)
+            else:
+                self._entries.move_to_end(list_id)
+            entry.users += 1
+            closing = self._closing.get(list_id)
+        try:
+            if closing is not None:
+                closing.closed.wait()
+            with entry.lock:
+                # Other callers of the same list wait here while it loads; other lists load in parallel.
+                if entry.manager is None:
+                    manager = TaskManager(filepath=path, storage=make_storage(self.backend, path))
+                    committer = GroupCommitter(manager) if self.commit_window is None else \
+                        GroupCommitter(manager, window=self.commit_window)
+                    entry.manager, entry.committer = manager, committer
+                    self.loads += 1
+        except BaseException:
+            with self._lock:
+                entry.users -= 1
+                if entry.manager is None and not entry.users and self._entries.get(list_id) is entry:
+                    del self._entries[list_id]
+            raise
+        self._evict()
+        return entry
+
+    def retain(self, entry):
+        """Hold an entry already held once more; each hold needs its own ``release``."""
+        with self._lock:
+            entry.users += 1
+
+    def release(self, entry):
+        with self._lock:
+            entry.users -= 1
+
+    @contextmanager
+    def use(self, list_id, create=True):
+        entry = self.acquire(list_id, create)
+        try:
+            yield entry.manager
+        finally:
+            self.release(entry)
+
+    def _over_budget(self):
+        if len(self._entries) > self.max_open:
+            return True
+        if self.max_bytes is None:
+            return False
+        loaded = sum(len(e.manager) for e in self._entries.values() if e.manager is not None)
+        return loaded * TASK_BYTES > self.max_bytes
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            # Oldest first; lists in use are skipped, so a busy pool may sit over budget until they're released.
+            for list_id, entry in list(self._entries.items()):
+                if not self._over_budget():
+                    break
+                if entry.users == 0 and entry.manager is not None:
+                    del self._entries[list_id]
+                    self._closing[list_id] = entry
+                    victims.append(entry)
+            self.evictions += len(victims)
+        for entry in victims:
+            self._close(entry)
+
+    def _close(self, entry):
+        try:
+            with entry.lock:
+                entry.committer.stop()
+                # A no-op unless the list's journal has changes to fold in.
+                entry.manager.compact()
+                entry.manager.close()
+        finally:
+            with self._lock:
+                if self._closing.get(entry.list_id) is entry:
+                    del self._closing[entry.list_id]
+            entry.closed.set()
+
+    def map(self, fn, list_ids=None):
+        """Call ``fn(manager)`` for every list (or ``list_ids``) in parallel, each synced and under its lock.
+
+        Returns ``{list_id: result}``; lists that vanish meanwhile are left out.
+        """
+        def run(list_id):
+            try:
+                with self.use(list_id, create=False) as manager:
+                    manager.sync()
+                    with manager.lock:
+                        return list_id, fn(manager)
+            except KeyError:
+                return list_id, run
+        ids = self.list_ids() if list_ids is None else list_ids
+        return {list_id: result for list_id, result in self._executor.map(run, ids) if result is not run}
+
+    def close(self):
+        """Flush and close every loaded list."""
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), OrderedDict()
+        for entry in entries:
+            if entry.manager is not None:
+                self._close(entry)
+        self._executor.shutdown(wait=True)
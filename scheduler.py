@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import logging
+from datetime import date, datetime, time
+
+from tasks import Task
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP = 60
+
+class ReminderScheduler:
+    """Calls reminder hooks for each unfinished task as its due date arrives.
+
+    Due dates are days, so a task becomes due at the local midnight that
+    starts its due day. The scheduler sleeps until the next due day in the
+    manager's pending due-date index, or until a mutation indexes a task due
+    sooner, then fetches only the tasks that have just become due: O(log N)
+    per wakeup plus the tasks it reminds about. Tasks that were already
+    overdue when it started are not reminded (see ``TaskManager.overdue``).
+    It also wakes every ``MAX_SLEEP`` seconds to pick up changes made by
+    other processes.
+
+    Hooks take the task (a copy) and may be plain functions or coroutines.
+    """
+
+    def __init__(self, manager, hooks=(), clock=datetime.now):
+        self.manager = manager
+        self.hooks = list(hooks)
+        self.clock = clock
+        self._day = None
+        self._fired = set()
+        self._wake = None
+        self._wake_day = None
+        self._loop = None
+        self._task = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        with self.manager.lock:
+            self.manager.due_listeners.append(self._changed)
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        with self.manager.lock:
+            self.manager.due_listeners.remove(self._changed)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _changed(self, day):
+        # Runs on whichever thread mutated the manager, under its lock.
+        if day is None or self._wake_day is None or day <= self._wake_day:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass  # the event loop has closed
+
+    def due_now(self):
+        """Return copies of the tasks that became due since the last call, and the next due date after today."""
+        today = self.clock().date()
+        if self._day != today:
+            # Days skipped while asleep (or across midnight) are dispatched in one go.
+            first = today if self._day is None else date.fromordinal(self._day.toordinal() + 1)
+            self._day, self._fired = today, set()
+        else:
+            first = today
+        self.manager.sync()
+        with self.manager.lock:
+            due = [Task.from_dict(t.to_dict())
+                   for t in self.manager.due_between(first.isoformat(), today.isoformat())
+                   if t.id not in self._fired]
+            next_day = self.manager.next_due(today.isoformat())
+        self._fired.update(t.id for t in due if t.due_date == today.isoformat())
+        return due, date.fromisoformat(next_day) if next_day else None
+
+    async def _fire(self, task):
+        for hook in self.hooks:
+            try:
+                result = hook(task)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Reminder hook %r failed for task %d", hook, task.id)
+
+    def _delay(self, next_day):
+        if next_day is None:
+            return MAX_SLEEP
+        seconds = (datetime.combine(next_day, time()) - self.clock()).total_seconds()
+        return min(MAX_SLEEP, max(0, seconds))
+
+    async def _run(self):
+        while True:
+            # Any change while collecting must wake us again.
+            self._wake_day = None
+            self._wake.clear()
+            due, next_day = await asyncio.to_thread(self.due_now)
+            for task in due:
+                await self._fire(task)
+            self._wake_day = next_day
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._delay(next_day))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,198 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Dict, List
+
+from indexes import SortedKeys
+
+TOKEN_RE = re.compile(r"\w+")
+TITLE_WEIGHT = 3
+EXACT_BONUS = 2
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def _weights(title, description):
+    weights: Dict[str, int] = {}
+    for token in tokenize(title):
+        weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+    for token in tokenize(description):
+        weights[token] = weights.get(token, 0) + 1
+    return weights
+
+def _term_score(term, weights):
+    best = 0
+    for token, w in weights.items():
+        if token.startswith(term):
+            best = max(best, w * (EXACT_BONUS if token == term else 1))
+    return best
+
+def scan(query, docs, limit=None):
+    """Rank ``(task_id, title, description)`` tuples as ``SearchIndex.search`` would, without an index."""
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    scores = {}
+    for task_id, title, description in docs:
+        # A term that prefixes a word is a substring, so most tasks are ruled out before tokenizing.
+        text = (title + "\n" + description).lower()
+        if not all(term in text for term in terms):
+            continue
+        weights = _weights(title, description)
+        total = 0
+        for term in terms:
+            s = _term_score(term, weights)
+            if not s:
+                break
+            total += s
+        else:
+            scores[task_id] = total
+    return _top(scores, limit)
+
+def _top(scores, limit):
+    key = lambda item: (-item[1], item[0])
+    if limit is None:
+        ranked = sorted(scores.items(), key=key)
+    else:
+        ranked = heapq.nsmallest(limit, scores.items(), key=key)
+    return [task_id for task_id, _ in ranked]
+
+class SearchIndex:
+    """Inverted index over task titles and descriptions.
+
+    Every query term matches indexed tokens it is a prefix of, and a task must
+    match all terms. Results are ranked by how often the terms occur (title hits
+    count ``TITLE_WEIGHT`` times, whole-word hits ``EXACT_BONUS`` times), then
+    by id. Each token's ids are also kept sorted per weight, so a one-term
+    search with a ``limit`` reads them best first and stops once it has
+    enough.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._by_weight: Dict[str, Dict[int, SortedKeys]] = {}
+        self._docs: Dict[int, Dict[str, int]] = {}
+        self._vocab: List[str] = []
+
+    @classmethod
+    def build(cls, docs):
+        """Index ``(task_id, title, description)`` tuples in one go, sorting each id list once."""
+        index = cls()
+        postings = index._postings
+        for task_id, title, description in docs:
+            weights = index._docs[task_id] = _weights(title, description)
+            for token, w in weights.items():
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = {}
+                posting[task_id] = w
+        for token, posting in postings.items():
+            levels: Dict[int, List[int]] = {}
+            for task_id, w in posting.items():
+                levels.setdefault(w, []).append(task_id)
+            index._by_weight[token] = {w: SortedKeys(ids) for w, ids in levels.items()}
+        index._vocab = sorted(postings)
+        return index
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, task_id, title, description=""):
+        weights = self._docs[task_id] = _weights(title, description)
+        for token, w in weights.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                self._by_weight[token] = {}
+                insort(self._vocab, token)
+            posting[task_id] = w
+            ids = self._by_weight[token].get(w)
+            if ids is None:
+                ids = self._by_weight[token][w] = SortedKeys()
+            ids.add(task_id)
+
+    def remove(self, task_id):
+        for token, w in self._docs.pop(task_id, {}).items():
+            posting = self._postings[token]
+            del posting[task_id]
+            levels = self._by_weight[token]
+            levels[w].remove(task_id)
+            if not len(levels[w]):
+                del levels[w]
+            if not posting:
+                del self._postings[token], self._by_weight[token]
+                del self._vocab[bisect_left(self._vocab, token)]
+
+    def update(self, task_id, title, description=""):
+        self.remove(task_id)
+        self.add(task_id, title, description)
+
+    def _expand(self, term):
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            yield self._vocab[i]
+            i += 1
+
+    def search(self, query, limit=None):
+        """Return ids of tasks matching every term of ``query``, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        expanded = {term: list(self._expand(term)) for term in terms}
+        if len(terms) == 1 and limit is not None:
+            term, = terms
+            return list(islice(self._ranked(term, expanded[term]), limit))
+        sizes = {term: sum(len(self._postings[tok]) for tok in expanded[term]) for term in terms}
+        scores = None
+        # Start from the rarest term so later terms only probe a small candidate set.
+        for term in sorted(terms, key=sizes.get):
+            if scores is not None and len(scores) * 16 < sizes[term]:
+                # Few candidates left: checking their own tokens beats walking the postings.
+                matches = self._match_docs(term, scores)
+            else:
+                matches = self._match_postings(term, expanded[term], scores)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {task_id: scores[task_id] + s for task_id, s in matches.items()}
+            if not scores:
+                return []
+        return _top(scores, limit)
+
+    def _ranked(self, term, tokens):
+        """Yield the ids matching one term best first, reading each token's ids a weight at a time."""
+        levels: Dict[int, list] = {}
+        for token in tokens:
+            bonus = EXACT_BONUS if token == term else 1
+            for w, ids in self._by_weight[token].items():
+                levels.setdefault(w * bonus, []).append(ids.range())
+        seen = set()
+        # A task's score is its best token's, so it is yielded at the first (highest) level it shows up in.
+        for score in sorted(levels, reverse=True):
+            for task_id in heapq.merge(*levels[score]):
+                if task_id not in seen:
+                    seen.add(task_id)
+                    yield task_id
+
+    def _match_postings(self, term, tokens, candidates):
+        matches: Dict[int, int] = {}
+        for token in tokens:
+            bonus = EXACT_BONUS if token == term else 1
+            for task_id, w in self._postings[token].items():
+                if candidates is not None and task_id not in candidates:
+                    continue
+                if w * bonus > matches.get(task_id, 0):
+                    matches[task_id] = w * bonus
+        return matches
+
+    def _match_docs(self, term, candidates):
+        matches: Dict[int, int] = {}
+        for task_id in candidates:
+            best = 0
+            for token, w in self._docs[task_id].items():
+                if token.startswith(term):
+                    best = max(best, w * (EXACT_BONUS if token == term else 1))
+            if best:
+                matches[task_id] = best
+        return matches
@@ -0,0 +1,213 @@
+"""Binary, memory-mapped task snapshots.
+
+Layout: a fixed header, a JSON block (store meta, the status table and any
+values that don't fit a record), a table of fixed-width records and a heap
+of UTF-8 text the records point into::
+
+    header | json | record * count | heap
+
+Loading maps the file and unpacks the record table in one pass, so there is
+no JSON to parse per task. Titles and short descriptions are decoded up
+front in one call; descriptions longer than ``LAZY_MIN`` characters stay in
+the mapping until first read.
+
+Convert an existing store with::
+
+    python snapshot.py tasks.json tasks.bin
+    python snapshot.py tasks.bin tasks.json
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from storage import JournalStorage, make_storage, write_temp
+from tasks import Task
+
+MAGIC = b"TASKSNP1"
+# magic, record count, then the offsets of the record table, the text heap and
+# the lazy heap, and the length of the JSON block.
+HEADER = struct.Struct("<8sIQQQI")
+# id, due ordinal (0 = none), status index, flags, created_at (epoch µs),
+# title offset/length, description offset/length. Titles and short
+# descriptions live in the text heap, which is decoded in one go, so their
+# offsets count characters; long descriptions live in the lazy heap and their
+# offsets count bytes.
+RECORD = struct.Struct("<qiHHqQIQI")
+RAW_DUE = 1
+RAW_CREATED = 2
+LAZY_DESCRIPTION = 4
+LAZY_MIN = 64
+
+class LazyText:
+    """UTF-8 text left in a mapped snapshot until ``str()`` decodes it."""
+
+    __slots__ = ("buf", "start", "end")
+
+    def __init__(self, buf, start, end):
+        self.buf = buf
+        self.start = start
+        self.end = end
+
+    def encode(self):
+        return self.buf[self.start:self.end]
+
+    def __str__(self):
+        return str(self.buf[self.start:self.end], "utf-8")
+
+def encode(items, meta):
+    """Serialize Tasks or task dicts, plus the store's meta, as a binary snapshot."""
+    statuses = {}
+    raw = {}
+    records = []
+    text = []
+    text_len = 0
+    lazy = bytearray()
+    pack = RECORD.pack
+    for item in items:
+        task = item if item.__class__ is Task else Task.from_dict(item)
+        flags = 0
+        due = task._due
+        if due is None:
+            due = 0
+        elif due.__class__ is not int:
+            raw.setdefault(str(task.id), {})["due_date"] = due
+            flags, due = flags | RAW_DUE, 0
+        created = task._created
+        if created.__class__ is not int:
+            raw.setdefault(str(task.id), {})["created_at"] = created
+            flags, created = flags | RAW_CREATED, 0
+        status = statuses.setdefault(task._status, len(statuses))
+        title_at = text_len
+        text.append(task.title)
+        text_len += len(task.title)
+        description = task._description
+        if description.__class__ is str and len(description) <= LAZY_MIN:
+            description_at, description_len = text_len, len(description)
+            text.append(description)
+            text_len += description_len
+        else:
+            # A description still in an old mapping is copied across without decoding.
+            data = description.encode()
+            flags |= LAZY_DESCRIPTION
+            description_at, description_len = len(lazy), len(data)
+            lazy += data
+        records.append(pack(task.id, due, status, flags, created,
+                            title_at, len(task.title), description_at, description_len))
+    block = json.dumps({"meta": meta, "statuses": list(statuses), "raw": raw}).encode()
+    heap = "".join(text).encode()
+    table = HEADER.size + len(block)
+    text_at = table + RECORD.size * len(records)
+    lazy_at = text_at + len(heap)
+    return b"".join([HEADER.pack(MAGIC, len(records), table, text_at, lazy_at, len(block)),
+                     block, *records, heap, lazy])
+
+def decode(buf):
+    """Return the Tasks and meta of the snapshot in ``buf`` (bytes or an mmap, which must stay open)."""
+    magic, count, table, text_at, lazy_at, size = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("not a binary task snapshot")
+    block = json.loads(bytes(buf[HEADER.size:HEADER.size + size]))
+    statuses = [sys.intern(s) for s in block["statuses"]]
+    raw = block["raw"]
+    text = str(buf[text_at:lazy_at], "utf-8")
+    new = Task.__new__
+    tasks = []
+    append = tasks.append
+    for (task_id, due, status, flags, created, title_at, title_len,
+         description_at, description_len) in RECORD.iter_unpack(memoryview(buf)[table:text_at]):
+        task = new(Task)
+        task.id = task_id
+        task.title = text[title_at:title_at + title_len]
+        task._status = statuses[status]
+        task._due = due or None
+        task._created = created
+        if flags:
+            if flags & LAZY_DESCRIPTION:
+                description_at += lazy_at
+                task._description = LazyText(buf, description_at, description_at + description_len)
+            else:
+                task._description = text[description_at:description_at + description_len]
+            if flags & RAW_DUE:
+                task._due = raw[str(task_id)]["due_date"]
+            if flags & RAW_CREATED:
+                task._created = raw[str(task_id)]["created_at"]
+        else:
+            task._description = text[description_at:description_at + description_len]
+        append(task)
+    return tasks, block["meta"]
+
+class BinaryStorage(JournalStorage):
+    """The journal backend with the snapshot kept as a memory-mapped binary file.
+
+    Commits append to ``<file>.log`` exactly as in journal mode; compaction
+    writes a fresh binary snapshot. Mappings are never closed explicitly:
+    lazily decoded descriptions keep their snapshot mapped (a replaced file
+    stays readable through it) until the last of them is decoded or dropped.
+    """
+
+    def files(self):
+        return (self.filepath, self.log_path, self.old_path)
+
+    def _read_snapshot(self):
+        try:
+            f = open(self.filepath, "rb")
+        except FileNotFoundError:
+            return [], None, 0
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return [], None, 0
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            tasks, meta = decode(buf)
+        except (ValueError, KeyError, struct.error):
+            # Keep the unreadable file around instead of overwriting it on the next save.
+            os.replace(self.filepath, self.filepath + ".corrupt")
+            return [], None, 0
+        return tasks, meta, size
+
+    def _stage_snapshot(self, items, meta):
+        data = encode(items, meta)
+        return [(write_temp(self.filepath, data), self.filepath, len(data))], dict(meta)
+
+def convert(src, dst, src_backend=None, dst_backend=None):
+    """Copy the store at ``src`` to a fresh snapshot at ``dst``; backends default from the extensions."""
+    if src_backend is None:
+        src_backend = "binary" if src.endswith(".bin") else "journal" if os.path.exists(src + ".log") else "json"
+    dst_backend = dst_backend or ("binary" if dst.endswith(".bin") else "json")
+    if os.path.exists(dst + ".log") and os.path.getsize(dst + ".log"):
+        raise ValueError(f"{dst}.log has uncompacted changes; remove it or pick another destination")
+    source = make_storage(src_backend, src)
+    try:
+        items = source.load()
+        meta = dict(source.meta)
+    finally:
+        source.close()
+    target = make_storage(dst_backend, dst)
+    try:
+        target._write_snapshot(items if dst_backend == "binary" else
+                               [i if isinstance(i, dict) else i.to_dict() for i in items], meta)
+    finally:
+        target.close()
+    return len(items)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between tasks.json and binary snapshots.")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--from", dest="src_backend", choices=("json", "journal", "binary"))
+    parser.add_argument("--to", dest="dst_backend", choices=("json", "journal", "binary"))
+    args = parser.parse_args(argv)
+    try:
+        count = convert(args.src, args.dst, args.src_backend, args.dst_backend)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Converted {count} tasks to {args.dst}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,683 @@
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOG_SUFFIX = ".log"
+COMPACT_BYTES = 8 * 1024 * 1024
+COMPACT_RATIO = 1.0
+COMPACT_MIN_BYTES = 64 * 1024
+CHANGES_RETENTION = 10000
+
+def write_temp(path, data):
+    """Write ``data`` to a temp file next to ``path`` and fsync it; ``replace_atomic`` then swaps it in."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+def replace_atomic(tmp, path):
+    """Swap ``tmp`` in as ``path`` so readers see either the old or the new file, never a torn one."""
+    os.replace(tmp, path)
+    sync_dir(path)
+
+def sync_dir(path):
+    """Make a rename into ``path``'s directory durable."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+def _lock_file(fd, blocking):
+    """Lock ``fd`` against other processes; False if it is taken and not ``blocking``."""
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    # msvcrt locks bytes from the current position, and LK_LOCK gives up after about 10 s.
+    while True:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+
+def _unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    """Re-entrant exclusive lock shared by the threads of this process and by other processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if not _lock_file(self._fd, blocking):
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_file(self._fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class Storage:
+    """Persistence backend behind a TaskManager.
+
+    ``load`` returns the stored tasks as dicts and fills ``meta`` (store-wide
+    values such as the id counter). ``commit`` persists a list of
+    ``("put", task_dict)``, ``("del", task_id)`` and ``("meta", dict)``
+    operations; ``snapshot`` is a callable returning the current ``Task``
+    objects for backends that rewrite everything.
+
+    Several processes may share one store. Writers hold ``lock`` (a
+    cross-process file lock) around syncing and committing, and ``poll``
+    reports what other processes changed since this one last loaded, polled or
+    committed: an empty list, the operations to apply, or None when only a full
+    reload will do.
+    """
+
+    meta = {}
+    # Running total of bytes this process has written to the store.
+    bytes_written = 0
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = FileLock(filepath + ".lock")
+
+    def files(self):
+        return (self.filepath,)
+
+    def size(self):
+        """Bytes the store currently occupies on disk."""
+        total = 0
+        for path in self.files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def load(self):
+        raise NotImplementedError
+
+    def poll(self):
+        raise NotImplementedError
+
+    def commit(self, ops, snapshot):
+        raise NotImplementedError
+
+    def save(self, tasks):
+        raise NotImplementedError
+
+    def close(self):
+        self.lock.close()
+
+class JSONStorage(Storage):
+    """The whole task list as one pretty-printed JSON file, rewritten on every commit.
+
+    Another process's write shows up as a new snapshot file, detected with one
+    ``stat`` call, and is picked up by a full reload.
+    """
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self.meta_path = filepath + ".meta"
+        self.meta = {}
+        self._disk_meta = None
+        self._seen = None
+        # Held by poll and while a snapshot is swapped in, so our own swap never looks like another writer's.
+        self._seen_lock = threading.Lock()
+        self.snapshot_bytes = 0
+
+    def files(self):
+        return (self.filepath, self.meta_path)
+
+    def _stamp(self, path=None):
+        try:
+            st = os.stat(path or self.filepath)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        with self.lock:
+            self._seen = self._stamp()
+            items, self._disk_meta, self.snapshot_bytes = self._read_snapshot()
+            self.meta = dict(self._disk_meta or {})
+            return items
+
+    def _read_snapshot(self):
+        """Return the snapshot's task dicts, its metadata and its size in bytes."""
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            meta = None
+        try:
+            with open(self.filepath, "rb") as f:
+                raw = f.read()
+            return json.loads(raw), meta, len(raw)
+        except FileNotFoundError:
+            return [], meta, 0
+        except json.JSONDecodeError:
+            # Keep the unreadable file around instead of overwriting it on the next save.
+            os.replace(self.filepath, self.filepath + ".corrupt")
+            return [], meta, 0
+
+    def poll(self):
+        with self._seen_lock:
+            return [] if self._stamp() == self._seen else None
+
+    def commit(self, ops, snapshot):
+        for op, arg in ops:
+            if op == "meta":
+                self.meta.update(arg)
+        self._write_snapshot([t.to_dict() for t in snapshot()], self.meta)
+
+    def save(self, tasks):
+        with self.lock:
+            self._write_snapshot([t.to_dict() for t in tasks], self.meta)
+
+    def _write_snapshot(self, items, meta):
+        self._install_snapshot(self._stage_snapshot(items, meta))
+
+    def _stage_snapshot(self, items, meta):
+        """Encode a snapshot into fsynced temp files, returning ``([(tmp, path, size)], meta)`` to install."""
+        files = []
+        if meta != self._disk_meta:
+            encoded = json.dumps(meta).encode()
+            files.append((write_temp(self.meta_path, encoded), self.meta_path, len(encoded)))
+        data = json.dumps(items, indent=2).encode()
+        files.append((write_temp(self.filepath, data), self.filepath, len(data)))
+        return files, dict(meta)
+
+    def _install_snapshot(self, staged):
+        """Swap staged snapshot files into place; the snapshot file goes last."""
+        files, meta = staged
+        for tmp, path, size in files:
+            if path == self.filepath:
+                # A rename keeps the stamp, so it can be noted in the same step as the swap.
+                stamp = self._stamp(tmp)
+                with self._seen_lock:
+                    os.replace(tmp, path)
+                    self._installed(stamp)
+                sync_dir(path)
+            else:
+                replace_atomic(tmp, path)
+            self.bytes_written += size
+        self._disk_meta = meta
+        self.snapshot_bytes = files[-1][2]
+
+    def _installed(self, stamp):
+        """Record a snapshot this process just swapped in; called under ``_seen_lock``."""
+        self._seen = stamp
+
+def _read_log(path, offset=0):
+    """Return the complete records in ``path`` from ``offset`` on, and the offset just past them.
+
+    A commit is one line, ``{"op": "commit", "ops": [...]}``, unpacked here into
+    its records; logs from before commits were framed hold one record per line.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    lines = data.split(b"\n")
+    records = []
+    for line in lines[:-1]:
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"{path}: corrupt journal record after byte {offset}")
+        if rec["op"] == "commit":
+            records.extend(rec["ops"])
+        else:
+            records.append(rec)
+    return records, offset + len(data) - len(lines[-1])
+
+def _item_id(item):
+    # Snapshot items are task dicts, or Task objects for the binary snapshot.
+    return item["id"] if isinstance(item, dict) else item.id
+
+def _apply_records(records, by_id, meta):
+    for rec in records:
+        if rec["op"] == "put":
+            by_id[rec["task"]["id"]] = rec["task"]
+        elif rec["op"] == "del":
+            by_id.pop(rec["id"], None)
+        elif rec["op"] == "meta":
+            meta.update(rec["meta"])
+
+class JournalStorage(JSONStorage):
+    """A JSON snapshot plus an append-only log of changes since it was written.
+
+    Each commit appends its operations to ``<file>.log`` as a single line with
+    a single fsync; a line cut short by a crash is dropped on the next load, so
+    a commit is replayed whole or not at all.
+    Once the log passes ``compact_bytes``, or ``compact_ratio`` times the size of
+    the snapshot, it is folded into a fresh snapshot on a background thread.
+    Other processes' commits are picked up by reading just the new tail of the
+    log.
+    """
+
+    def __init__(self, filepath, compact_bytes=COMPACT_BYTES, compact_ratio=COMPACT_RATIO):
+        super().__init__(filepath)
+        self.log_path = filepath + LOG_SUFFIX
+        self.old_path = self.log_path + ".old"
+        self.compact_bytes = compact_bytes
+        self.compact_ratio = compact_ratio
+        self.compact_lock = FileLock(filepath + ".compact.lock")
+        self._log = None
+        self._log_bytes = 0
+        # How far this process has read: (snapshot inode, log inode, log offset), or None once lost.
+        self._position = None
+        self._compactor = None
+
+    def files(self):
+        return super().files() + (self.log_path, self.old_path)
+
+    def load(self):
+        with self.lock:
+            items = super().load()
+            snapshot_ino = _inode(self.filepath)
+            logs = []
+            for path in (self.old_path, self.log_path):
+                records, end = _read_log(path)
+                logs.append(records)
+                if os.path.exists(path) and os.path.getsize(path) > end:
+                    # Torn final append (we hold the writer lock, so nobody is mid-write): drop it.
+                    with open(path, "r+b") as f:
+                        f.truncate(end)
+            if any(logs):
+                by_id = {_item_id(d): d for d in items}
+                for records in logs:
+                    _apply_records(records, by_id, self.meta)
+                items = list(by_id.values())
+            if os.path.exists(self.old_path) and self.compact_lock.acquire(blocking=False):
+                # A previous compaction was interrupted; finish it before taking new writes.
+                try:
+                    self._write_snapshot(items, self.meta)
+                    open(self.log_path, "wb").close()
+                    os.remove(self.old_path)
+                    snapshot_ino, end = _inode(self.filepath), 0
+                finally:
+                    self.compact_lock.release()
+            with self._seen_lock:
+                self._open_log()
+                self._position = (snapshot_ino, os.fstat(self._log.fileno()).st_ino, end)
+            return items
+
+    def _installed(self, stamp):
+        super()._installed(stamp)
+        # The new snapshot holds everything we had read, so carry on from it (also once the first one exists).
+        if self._position is not None:
+            self._position = (stamp[0],) + self._position[1:]
+
+    def _open_log(self):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, "ab")
+        self._log_bytes = self._log.tell()
+
+    def poll(self):
+        with self._seen_lock:
+            if self._position is None:
+                return None
+            snapshot_ino, log_ino, offset = self._position
+            try:
+                st = os.stat(self.log_path)
+            except FileNotFoundError:
+                return None
+            if _inode(self.filepath) != snapshot_ino or st.st_ino != log_ino or st.st_size < offset:
+                return None
+            if st.st_size == offset:
+                return []
+            records, end = _read_log(self.log_path, offset)
+            self._position = (snapshot_ino, log_ino, end)
+        ops = []
+        for rec in records:
+            if rec["op"] == "put":
+                ops.append(("put", rec["task"]))
+            elif rec["op"] == "del":
+                ops.append(("del", rec["id"]))
+            else:
+                self.meta.update(rec["meta"])
+                ops.append(("meta", rec["meta"]))
+        return ops
+
+    def commit(self, ops, snapshot):
+        records = []
+        for op, arg in ops:
+            if op == "put":
+                rec = {"op": "put", "task": arg}
+            elif op == "del":
+                rec = {"op": "del", "id": arg}
+            else:
+                rec = {"op": "meta", "meta": arg}
+                self.meta.update(arg)
+            records.append(rec)
+        data = (json.dumps({"op": "commit", "ops": records}, separators=(",", ":")) + "\n").encode()
+        with self._seen_lock:
+            if _inode(self.log_path) != os.fstat(self._log.fileno()).st_ino:
+                # Another process rotated the log. Callers poll before committing, so
+                # that has already forced a reload; just follow the new file.
+                self._open_log()
+            self._log.write(data)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_bytes = self._log.tell()
+            self.bytes_written += len(data)
+            if self._position is not None:
+                self._position = self._position[:2] + (self._log_bytes,)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        if self._log_bytes < self.compact_bytes and (
+                self._log_bytes < COMPACT_MIN_BYTES
+                or self._log_bytes < self.compact_ratio * self.snapshot_bytes):
+            return
+        self._compactor = threading.Thread(target=self.compact, kwargs={"blocking": False}, daemon=True)
+        self._compactor.start()
+
+    def compact(self, snapshot=None, blocking=True):
+        """Fold the journal into a fresh snapshot.
+
+        The live log is rotated aside first so writers keep appending while the
+        new snapshot is built from the old snapshot plus the rotated log, read
+        back from disk, and written to a temp file; the store lock is held only
+        to rotate the log and to swap the snapshot in. Journal records are full-state puts and deletes, so
+        replaying the rotated log over a newer snapshot is harmless if we crash
+        before it is removed. Only one process compacts at a time.
+        """
+        if not self.compact_lock.acquire(blocking):
+            return
+        try:
+            with self.lock, self._seen_lock:
+                st = os.stat(self.log_path)
+                if not st.st_size and not os.path.exists(self.old_path):
+                    return  # nothing to fold in
+                synced = self._position is not None and self._position[1:] == (st.st_ino, st.st_size)
+                if os.path.exists(self.old_path):
+                    with open(self.log_path, "rb") as src, open(self.old_path, "ab") as dst:
+                        dst.write(src.read())
+                    os.remove(self.log_path)
+                else:
+                    os.replace(self.log_path, self.old_path)
+                self._open_log()
+                # Only a process that had read the whole old log can carry on from the new one.
+                self._position = (self._position[0], os.fstat(self._log.fileno()).st_ino, 0) if synced else None
+            items, meta, _ = self._read_snapshot()
+            by_id = {_item_id(d): d for d in items}
+            meta = dict(meta or {})
+            _apply_records(_read_log(self.old_path)[0], by_id, meta)
+            # Writers only wait for the swap: loads read the snapshot and the rotated log under
+            # the lock, so the new snapshot must replace the old one and the log go together.
+            staged = self._stage_snapshot(list(by_id.values()), meta)
+            with self.lock:
+                self._install_snapshot(staged)
+                os.remove(self.old_path)
+        finally:
+            self.compact_lock.release()
+
+    def save(self, tasks):
+        self.compact()
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self.compact_lock.close()
+        super().close()
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+def _connect(path):
+    """One shared connection per database file per process, closed by ``_disconnect`` once nobody uses it."""
+    key = (os.path.abspath(path), os.getpid())
+    with _connections_lock:
+        entry = _connections.get(key)
+        if entry is None:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL syncs the WAL on every commit, so an acknowledged write survives power loss as it does
+            # in the journal; NORMAL would only sync at checkpoints.
+            conn.execute("PRAGMA synchronous=FULL")
+            entry = _connections[key] = [conn, threading.RLock(), 0]
+        entry[2] += 1
+        return entry[0], entry[1]
+
+def _disconnect(path):
+    key = (os.path.abspath(path), os.getpid())
+    with _connections_lock:
+        entry = _connections[key]
+        entry[2] -= 1
+        if entry[2]:
+            return
+        del _connections[key]
+    with entry[1]:
+        entry[0].close()
+
+class SQLiteStorage(Storage):
+    """Tasks as rows in an indexed SQLite table; each commit touches only the rows it changes.
+
+    Every commit also records the ids it touched in a ``changes`` table, so
+    other processes can fetch just those rows when they poll.
+    """
+
+    COLUMNS = ("id", "title", "description", "due_date", "status", "created_at")
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self.meta = {}
+        self._seq = 0
+        self.conn, self.conn_lock = _connect(filepath)
+        with self.conn_lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL DEFAULT '',
+                    due_date TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+                CREATE INDEX IF NOT EXISTS tasks_due_date ON tasks (due_date);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id INTEGER NOT NULL
+                );
+            """)
+
+    def files(self):
+        return (self.filepath, self.filepath + "-wal")
+
+    def _last_seq(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _read_meta(self):
+        return {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
+
+    def load(self):
+        with self.conn_lock:
+            self.conn.execute("BEGIN")
+            try:
+                rows = self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM tasks ORDER BY id").fetchall()
+                self.meta = self._read_meta()
+                self._seq = self._last_seq()
+            finally:
+                self.conn.execute("COMMIT")
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def poll(self):
+        with self.conn_lock:
+            self.conn.execute("BEGIN")
+            try:
+                if self._last_seq() == self._seq:
+                    return []
+                meta = self._read_meta()
+                first = self.conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+                if meta.get("generation") != self.meta.get("generation") or first > self._seq + 1:
+                    # Rewritten by save(), or we fell behind the retained change rows.
+                    return None
+                changed = self.conn.execute(
+                    "SELECT seq, task_id FROM changes WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+                ops = []
+                for task_id in dict.fromkeys(task_id for _, task_id in changed):
+                    row = self.conn.execute(
+                        f"SELECT {', '.join(self.COLUMNS)} FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                    ops.append(("put", dict(zip(self.COLUMNS, row))) if row else ("del", task_id))
+                self.meta = meta
+                ops.append(("meta", dict(meta)))
+                self._seq = changed[-1][0]
+                return ops
+            finally:
+                self.conn.execute("COMMIT")
+
+    def _write(self, ops, log=True):
+        cur = self.conn.cursor()
+        for op, arg in ops:
+            if op == "put":
+                row = tuple(arg[c] for c in self.COLUMNS)
+                cur.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)", row)
+                # Row payload only; SQLite's own page and WAL overhead isn't counted.
+                self.bytes_written += sum(len(v) for v in row[1:] if v) + 8
+                if log:
+                    cur.execute("INSERT INTO changes (task_id) VALUES (?)", (arg["id"],))
+            elif op == "del":
+                cur.execute("DELETE FROM tasks WHERE id = ?", (arg,))
+                if log:
+                    cur.execute("INSERT INTO changes (task_id) VALUES (?)", (arg,))
+            else:
+                cur.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [(k, json.dumps(v)) for k, v in arg.items()])
+                self.meta.update(arg)
+
+    def commit(self, ops, snapshot):
+        with self.conn_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(ops)
+                seq = self._last_seq()
+                if seq // 1000 != self._seq // 1000:
+                    self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGES_RETENTION,))
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            self._seq = seq
+
+    def save(self, tasks):
+        # A full rewrite can't be described row by row, so bump the generation
+        # and let other processes reload.
+        generation = self.meta.get("generation", 0) + 1
+        with self.lock, self.conn_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM tasks")
+                self._write([("put", t.to_dict()) for t in tasks], log=False)
+                self._write([("meta", {"generation": generation})], log=False)
+                self.conn.execute("INSERT INTO changes (task_id) VALUES (0)")
+                seq = self._last_seq()
+                self.conn.execute("DELETE FROM changes WHERE seq < ?", (seq,))
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            self._seq = seq
+
+    def close(self):
+        if self.conn is not None:
+            self.conn = None
+            _disconnect(self.filepath)
+        super().close()
+
+BACKENDS = {
+    "json": JSONStorage,
+    "journal": JournalStorage,
+    "sqlite": SQLiteStorage,
+}
+
+DEFAULT_PATHS = {
+    "json": "tasks.json",
+    "journal": "tasks.json",
+    "sqlite": "tasks.db",
+    "binary": "tasks.bin",
+}
+
+def make_storage(backend="json", filepath=None):
+    if backend == "binary":
+        # Imported lazily: snapshot.py builds Task objects and tasks.py imports this module.
+        from snapshot import BinaryStorage as cls
+    else:
+        try:
+            cls = BACKENDS[backend]
+        except KeyError:
+            raise ValueError(f"Unknown storage backend {backend!r}; choose from {', '.join(DEFAULT_PATHS)}")
+    return cls(filepath or DEFAULT_PATHS[backend])
@@ -1,92 +1,899 @@
-from dataclasses import dataclass, asdict, field
-from typing import Optional, List
+from contextlib import contextmanager
+import functools
+import gc
+from typing import Optional, List, Dict
 import json
-from datetime import datetime
+import os
+import sys
+import threading
+import time
+from datetime import datetime, date, timedelta
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from math import isqrt
+from changes import ChangeLog, RETENTION as CHANGE_RETENTION
+from indexes import SortedKeys
+from metrics import Histogram, FAST_BUCKETS, BYTES_BUCKETS
+from search import SearchIndex, scan, tokenize
+from storage import JSONStorage, JournalStorage, make_storage, DEFAULT_PATHS
 
 DATA_FILE = "tasks.json"
 DATE_FORMAT = "%Y-%m-%d"
+SORTS = ("id", "-id", "due_date", "-due_date")
+TASK_FIELDS = ("id", "title", "description", "due_date", "status", "created_at")
+MAX_IMPORT_ERRORS = 100
+# Stores at least this large build their search index on a background thread (about 1 s per 100k tasks).
+TEXT_INDEX_BACKGROUND = 10000
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Far fewer distinct due dates than tasks, so memoize the conversions.
+@functools.lru_cache(maxsize=4096)
+def _encode_date(s):
+    # YYYY-MM-DD -> proleptic ordinal; anything that wouldn't round-trip stays a string.
+    if isinstance(s, str) and len(s) == 10:
+        try:
+            d = date.fromisoformat(s)
+        except ValueError:
+            return s
+        if d.isoformat() == s:
+            return d.toordinal()
+    return s
+
+@functools.lru_cache(maxsize=4096)
+def _decode_date(v):
+    return date.fromordinal(v).isoformat() if isinstance(v, int) else v
+
+def _encode_timestamp(s):
+    # ISO timestamp -> microseconds since the epoch, when that round-trips exactly.
+    try:
+        dt = datetime.fromisoformat(s)
+    except (TypeError, ValueError):
+        return s
+    # The layout datetime.isoformat() itself produces is known to round-trip.
+    canonical = len(s) > 10 and s[10] == "T" and (len(s) == 19 or len(s) == 26 and s[19] == "." and s[20:] != "000000")
+    if dt.tzinfo is not None or not canonical and dt.isoformat() != s:
+        return s
+    return (dt - EPOCH) // MICROSECOND
+
+def _decode_timestamp(v):
+    return (EPOCH + v * MICROSECOND).isoformat() if isinstance(v, int) else v
 
-@dataclass
 class Task:
-    id: int
-    title: str
-    description: str = ""
-    due_date: Optional[str] = None  
-    status: str = "Pending"         
-    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    """A single task.
+
+    Stored compactly: no per-instance ``__dict__``, interned status strings,
+    and ``due_date``/``created_at`` held as integers (a date ordinal and
+    microseconds since the epoch) that are turned back into the same ISO
+    strings on access. A description loaded from a binary snapshot may be a
+    reference into the mapped file, decoded the first time it is read.
+    """
+
+    __slots__ = ("id", "title", "_description", "_due", "_status", "_created")
+
+    def __init__(self, id: int, title: str, description: str = "", due_date: Optional[str] = None,
+                 status: str = "Pending", created_at: Optional[str] = None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self._due = _encode_date(due_date)
+        self._status = sys.intern(status)
+        self._created = _encode_timestamp(created_at or datetime.utcnow().isoformat())
+
+    @property
+    def description(self) -> str:
+        d = self._description
+        if d.__class__ is not str:
+            d = self._description = str(d)
+        return d
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+
+    @property
+    def due_date(self) -> Optional[str]:
+        return _decode_date(self._due)
+
+    @due_date.setter
+    def due_date(self, value):
+        self._due = _encode_date(value)
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        self._status = sys.intern(value)
+
+    @property
+    def created_at(self) -> str:
+        return _decode_timestamp(self._created)
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created = _encode_timestamp(value)
 
     def to_dict(self):
-        return asdict(self)
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "due_date": _decode_date(self._due),
+            "status": self._status,
+            "created_at": _decode_timestamp(self._created),
+        }
 
     @staticmethod
     def from_dict(d):
         return Task(**d)
 
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.id, self.title, self.description, self._due, self._status, self._created) == \
+            (other.id, other.title, other.description, other._due, other._status, other._created)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"Task(id={self.id!r}, title={self.title!r}, description={self.description!r}, "
+                f"due_date={self.due_date!r}, status={self.status!r}, created_at={self.created_at!r})")
+
+class BatchError(ValueError):
+    """Raised by the ``*_many`` methods; ``errors`` maps item positions to messages."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid item(s) in batch")
+        self.errors = errors
+
+def _valid_due(due_date):
+    if due_date is None:
+        return True
+    try:
+        datetime.strptime(due_date, DATE_FORMAT)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _parse_import(line):
+    if isinstance(line, bytes):
+        try:
+            line = line.decode()
+        except UnicodeDecodeError:
+            raise ValueError("not valid UTF-8")
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON ({e.msg})")
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    item = {k: v for k, v in item.items() if k in TASK_FIELDS}
+    if not isinstance(item.get("title"), str) or not item["title"].strip():
+        raise ValueError("title is required")
+    if "id" in item and (not isinstance(item["id"], int) or isinstance(item["id"], bool) or item["id"] < 1):
+        raise ValueError("id must be a positive integer")
+    if not _valid_due(item.get("due_date")):
+        raise ValueError("due_date must be YYYY-MM-DD")
+    for key in ("description", "status", "created_at"):
+        if key in item and not isinstance(item[key], str):
+            raise ValueError(f"{key} must be a string")
+    return item
+
+def _due_key(task):
+    return _due_sort_key(task._due, task.id)
+
+def _due_sort_key(due, task_id):
+    # Dated tasks first by day ordinal, then unparseable due strings, then undated ones; ties by id.
+    if isinstance(due, int):
+        return (0, due, task_id)
+    if due:
+        return (1, due, task_id)
+    return (2, 0, task_id)
+
+def _pending_due_key(task):
+    if isinstance(task._due, int) and task.status != "Completed":
+        return (task._due, task.id)
+    return None
+
+def _pending_bound(key):
+    # A due-date index bound as a bound on (day, id) keys: undated and unparseable dates sort after every day.
+    if key is None:
+        return None
+    return key[1:] if key[0] == 0 else (float("inf"),)
+
+def _day(value, name):
+    day = _encode_date(value)
+    if not isinstance(day, int):
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+    return day
+
+OPERATION_SECONDS = Histogram(
+    "tasks_manager_operation_seconds", "Time spent in TaskManager load, save, commit, find and search.",
+    ("operation",), FAST_BUCKETS)
+WRITE_BYTES = Histogram(
+    "tasks_storage_write_bytes", "Bytes written to storage per commit or full save.", ("operation",), BYTES_BUCKETS)
+
+def _timed(operation):
+    """Record how long a TaskManager method takes in ``OPERATION_SECONDS``."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - start, operation)
+        return wrapper
+    return decorate
+
+def _mutation(method):
+    """Run a TaskManager method inside ``batch()`` (under the store lock, after syncing, committed on exit)
+    and under ``lock``, so readers see its changes together with the version they bump."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.batch(), self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class TaskManager:
-    def __init__(self, filepath=DATA_FILE):
-        self.filepath = filepath
-        self.tasks: List[Task] = []
+    def __init__(self, filepath=DATA_FILE, journal=False, storage=None, change_retention=CHANGE_RETENTION):
+        if storage is None:
+            storage = JournalStorage(filepath) if journal else JSONStorage(filepath)
+        self.storage = storage
+        self.filepath = getattr(storage, "filepath", filepath)
+        self._tasks: Dict[int, Task] = {}
+        self._next = 1
+        self.version = 0
+        self._base_version = 0
+        self._task_versions: Dict[int, int] = {}
+        self._text: Optional[SearchIndex] = None
+        # While a large store's search index is built in the background: ids changed since it started.
+        self._text_dirty: Optional[set] = None
+        self._ids = SortedKeys()
+        # Secondary indexes are built on first use, like the text index, so startup only pays for the id index.
+        self._by_status: Optional[Dict[str, SortedKeys]] = None
+        self._by_due: Optional[SortedKeys] = None
+        # Due-date keys per status, for status filters combined with a due range or sort.
+        self._by_status_due: Optional[Dict[str, SortedKeys]] = None
+        # (day ordinal, id) of unfinished tasks with a real due date, for overdue/upcoming and reminders.
+        self._pending_due: Optional[SortedKeys] = None
+        # Called with the due date of each unfinished task (re)indexed, or None after a reload.
+        self.due_listeners = []
+        self._batch_depth = 0
+        # The thread in the current batch; others wait for the store lock rather than join it.
+        self._batch_owner = None
+        self._pending = []
+        # Create/update/complete/delete events of the current batch, logged when it commits.
+        self._pending_changes = []
+        self.changes = ChangeLog(change_retention)
+        # Guards in-memory state when the manager is shared between threads (see groupcommit.py).
+        self.lock = threading.RLock()
         self._load()
 
+    @property
+    def tasks(self) -> List[Task]:
+        return list(self._tasks.values())
+
+    @_timed("load")
     def _load(self):
+        self._tasks = {}
+        self._text = self._by_status = self._by_due = self._by_status_due = self._pending_due = None
+        # A build still running for the old tasks sees this change and gives up.
+        self._text_dirty = None
+        # Loading only allocates, so a collection pass would find nothing to free.
+        collecting = gc.isenabled()
+        gc.disable()
         try:
-            with open(self.filepath, "r") as f:
-                data = json.load(f)
-            self.tasks = [Task.from_dict(item) for item in data]
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.tasks = []
+            for item in self.storage.load():
+                # Binary snapshots hand over ready-made Tasks; everything else gives dicts.
+                task = item if item.__class__ is Task else Task.from_dict(item)
+                self._tasks[task.id] = task
+        finally:
+            if collecting:
+                gc.enable()
+        self._ids = SortedKeys(self._tasks)
+        # The stored counter never goes backwards, so ids of deleted tasks are not reused.
+        self._next = max(self.storage.meta.get("next_id", 1), max(self._tasks, default=0) + 1)
+        # Tasks unchanged since the load share the store version we loaded at; any
+        # later change moves the task to a strictly higher version.
+        self.version = max(self.version, self.storage.meta.get("version", 0))
+        self._base_version = self.version
+        self._task_versions = {}
+        self.changes.reset(self.version)
+        for listener in self.due_listeners:
+            listener(None)
 
     def save(self):
-        with open(self.filepath, "w") as f:
-            json.dump([t.to_dict() for t in self.tasks], f, indent=2)
+        written = self.storage.bytes_written
+        with OPERATION_SECONDS.time("save"):
+            self.storage.save(self.get_all())
+        WRITE_BYTES.observe(self.storage.bytes_written - written, "save")
+
+    def _flush(self, ops):
+        written = self.storage.bytes_written
+        with OPERATION_SECONDS.time("commit"):
+            self.storage.commit(ops, self.get_all)
+        WRITE_BYTES.observe(self.storage.bytes_written - written, "commit")
+
+    def _commit(self, ops, change=None):
+        """Persist ``ops``, or queue them until the outermost batch ends.
+
+        ``change`` names the event (create, update or complete) each ``put``
+        is logged as in ``changes``; deletes are logged as delete.
+        """
+        if self._batch_depth:
+            if not self._pending:
+                # A batch's first change moves the store to its new version, while the caller still
+                # holds ``lock``, so no reader pairs new data with the old version.
+                self.version += 1
+            for op, arg in ops:
+                if op == "put":
+                    self._task_versions[arg["id"]] = self.version
+                elif op == "del":
+                    self._task_versions.pop(arg, None)
+            self._pending.extend(ops)
+            self._pending_changes.extend((change, arg["id"], arg) if op == "put" else ("delete", arg, None)
+                                         for op, arg in ops if op != "meta")
+        else:
+            self._flush(ops)
+
+    @contextmanager
+    def batch(self):
+        """Group mutations so they reach storage in a single commit.
+
+        The outermost batch holds the store's cross-process lock, first syncs
+        any changes other processes made, and commits on exit. Batches nest.
+        What was applied is committed even if the block raises, so memory and
+        storage stay in step.
+        """
+        if self._batch_depth and self._batch_owner == threading.get_ident():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+        with self.storage.lock:
+            self.sync()
+            self._batch_depth, self._batch_owner = 1, threading.get_ident()
+            try:
+                yield self
+            finally:
+                self._batch_depth = 0
+                if self._pending:
+                    ops, self._pending = self._pending, []
+                    changes, self._pending_changes = self._pending_changes, []
+                    ops.append(("meta", {"version": self.version}))
+                    try:
+                        self._flush(ops)
+                    finally:
+                        self.changes.extend(self.version, changes)
+
+    def task_version(self, task_id):
+        """Version of the store when ``task_id`` last changed (or when it was loaded)."""
+        return self._task_versions.get(task_id, self._base_version)
+
+    def sync(self):
+        """Apply changes other processes made to the store; returns True if there were any.
+
+        When nothing changed this costs a stat call or an indexed query,
+        depending on the backend. Writers take the store lock before ``lock``,
+        and a full reload needs the store lock too, so call this before taking
+        ``lock``, never while holding it.
+        """
+        with self.lock:
+            ops = self.storage.poll()
+            if ops is not None:
+                return self._apply(ops)
+        with self.storage.lock, self.lock:
+            # Another thread may have reloaded while we waited for the store lock.
+            ops = self.storage.poll()
+            if ops is not None:
+                return self._apply(ops)
+            self._load()
+            return True
+
+    def _apply(self, ops):
+        """Apply the operations ``poll`` returned; the caller holds ``lock``."""
+        changed, changes = [], []
+        version = 0
+        for op, arg in ops:
+            if op == "put":
+                old = self._tasks.get(arg["id"])
+                if old is None:
+                    change = "create"
+                elif arg.get("status") == "Completed" and old.status != "Completed":
+                    change = "complete"
+                else:
+                    change = "update"
+                self._replace(Task.from_dict(arg))
+                changed.append(arg["id"])
+                changes.append((change, arg["id"], arg))
+            elif op == "del":
+                t = self._tasks.pop(arg, None)
+                if t is not None:
+                    self._unindex(t)
+                self._task_versions.pop(arg, None)
+                changes.append(("delete", arg, None))
+            else:
+                self._next = max(self._next, arg.get("next_id", 1))
+                version = max(version, arg.get("version", 0))
+        if changes:
+            # Adopt the writer's version so processes agree, but never reuse one we've served.
+            self.version = version if version > self.version else self.version + 1
+            for task_id in changed:
+                self._task_versions[task_id] = self.version
+            self.changes.extend(self.version, changes)
+        return bool(ops)
+
+    def compact(self):
+        if hasattr(self.storage, "compact"):
+            self.storage.compact(self.get_all)
+
+    def close(self):
+        self.storage.close()
+
+    def _index(self, task, text=True):
+        self._ids.add(task.id)
+        if self._by_status is not None:
+            self._by_status.setdefault(task.status, SortedKeys()).add(task.id)
+        if self._by_due is not None:
+            self._by_due.add(_due_key(task))
+        if self._by_status_due is not None:
+            self._by_status_due.setdefault(task.status, SortedKeys()).add(_due_key(task))
+        key = _pending_due_key(task)
+        if key:
+            if self._pending_due is not None:
+                self._pending_due.add(key)
+            if self.due_listeners:
+                day = date.fromordinal(key[0])
+                for listener in self.due_listeners:
+                    listener(day)
+        if text and self._text is not None:
+            self._text.add(task.id, task.title, task.description)
+        elif text and self._text_dirty is not None:
+            self._text_dirty.add(task.id)
+
+    def _unindex(self, task, text=True):
+        self._ids.remove(task.id)
+        if self._by_status is not None:
+            self._by_status[task.status].remove(task.id)
+        if self._by_due is not None:
+            self._by_due.remove(_due_key(task))
+        if self._by_status_due is not None:
+            self._by_status_due[task.status].remove(_due_key(task))
+        key = _pending_due_key(task)
+        if key and self._pending_due is not None:
+            self._pending_due.remove(key)
+        if text and self._text is not None:
+            self._text.remove(task.id)
+        elif text and self._text_dirty is not None:
+            self._text_dirty.add(task.id)
+
+    def _status_index(self, status):
+        if self._by_status is None:
+            by_status = {}
+            for t in self._tasks.values():
+                by_status.setdefault(t.status, []).append(t.id)
+            self._by_status = {s: SortedKeys(ids) for s, ids in by_status.items()}
+        return self._by_status.get(status) or SortedKeys()
+
+    def _due_index(self):
+        if self._by_due is None:
+            self._by_due = SortedKeys(map(_due_key, self._tasks.values()))
+        return self._by_due
+
+    def _status_due_index(self, status):
+        if self._by_status_due is None:
+            by_status = {}
+            for t in self._tasks.values():
+                by_status.setdefault(t.status, []).append(_due_key(t))
+            self._by_status_due = {s: SortedKeys(keys) for s, keys in by_status.items()}
+        return self._by_status_due.get(status) or SortedKeys()
+
+    def _pending_due_index(self):
+        if self._pending_due is None:
+            self._pending_due = SortedKeys(k for k in map(_pending_due_key, self._tasks.values()) if k)
+        return self._pending_due
+
+    def _text_index(self):
+        """The search index, or None while it is being built; the caller holds ``lock``.
+
+        Built on the first indexed search rather than at load, then kept
+        current by _index/_unindex. Stores of ``TEXT_INDEX_BACKGROUND`` tasks
+        or more build it on a background thread, so the search that starts the
+        build (and any until it is done) falls back to a scan.
+        """
+        if self._text is None and self._text_dirty is None:
+            if len(self._tasks) < TEXT_INDEX_BACKGROUND:
+                self._text = self._build_text(self._tasks.values())
+            else:
+                dirty = self._text_dirty = set()
+                threading.Thread(target=self._build_text_in_background, args=(list(self._tasks.values()), dirty),
+                                 name="search-index", daemon=True).start()
+        return self._text
+
+    @staticmethod
+    def _build_text(tasks):
+        return SearchIndex.build((t.id, t.title, t.description) for t in tasks)
+
+    def _build_text_in_background(self, tasks, dirty):
+        text = self._build_text(tasks)
+        with self.lock:
+            if self._text_dirty is not dirty:
+                return  # reloaded meanwhile
+            # Tasks changed during the build may have been read either side of the change: redo them.
+            for task_id in dirty:
+                text.remove(task_id)
+                t = self._tasks.get(task_id)
+                if t is not None:
+                    text.add(t.id, t.title, t.description)
+            self._text, self._text_dirty = text, None
 
     def _next_id(self):
-        return max((t.id for t in self.tasks), default=0) + 1
+        task_id = self._next
+        self._next += 1
+        return task_id
 
+    @_mutation
     def add_task(self, title, description="", due_date=None):
         task = Task(id=self._next_id(), title=title, description=description, due_date=due_date)
-        self.tasks.append(task)
-        self.save()
+        self._tasks[task.id] = task
+        self._index(task)
+        self._commit([("put", task.to_dict()), ("meta", {"next_id": self._next})], "create")
         return task
 
+    def _replace(self, task):
+        old = self._tasks.get(task.id)
+        if old is not None:
+            self._unindex(old)
+        self._tasks[task.id] = task
+        self._index(task)
+
+    def _upsert(self, task):
+        change = "update" if task.id in self._tasks else "create"
+        self._replace(task)
+        ops = [("put", task.to_dict())]
+        if task.id >= self._next:
+            self._next = task.id + 1
+            ops.append(("meta", {"next_id": self._next}))
+        self._commit(ops, change)
+
     def get_all(self):
-        return list(self.tasks)
+        return list(self._tasks.values())
+
+    def export_ndjson(self, page_size=1000):
+        """Yield every task as one JSON line, in id order.
+
+        Tasks are read a page at a time through ``query``, so memory stays
+        bounded by ``page_size`` and concurrent changes don't break iteration.
+        """
+        after = None
+        while True:
+            with self.lock:
+                page = self.query(after_id=after, limit=page_size)
+            if not page:
+                return
+            for t in page:
+                yield json.dumps(t.to_dict(), separators=(",", ":")) + "\n"
+            after = page[-1].id
+
+    def import_ndjson(self, lines, chunk_size=1000, first_line=1):
+        """Load tasks from an iterable of JSON lines, committing every ``chunk_size`` tasks.
+
+        A line carrying an ``id`` replaces that task (or creates it with that
+        id); lines without one get a new id. Invalid lines are skipped and
+        reported. Returns counts, up to ``MAX_IMPORT_ERRORS`` error messages and
+        the throughput.
+        """
+        start = time.perf_counter()
+        imported = failed = 0
+        errors = []
+        chunk = []
 
+        def flush():
+            with self.batch():
+                for item in chunk:
+                    if "id" in item:
+                        self._upsert(Task.from_dict(item))
+                    else:
+                        self.add_task(item["title"], item.get("description", ""), item.get("due_date"))
+            chunk.clear()
+
+        for n, line in enumerate(lines, first_line):
+            if not line.strip():
+                continue
+            try:
+                item = _parse_import(line)
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append(f"line {n}: {e}")
+                continue
+            chunk.append(item)
+            imported += 1
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        seconds = time.perf_counter() - start
+        return {
+            "imported": imported,
+            "failed": failed,
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "tasks_per_second": round(imported / seconds) if seconds else 0,
+        }
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def status_counts(self):
+        """Number of tasks per status, from the status index."""
+        self._status_index(None)
+        return {status: len(ids) for status, ids in self._by_status.items() if len(ids)}
+
+    @_timed("find")
     def find(self, task_id):
-        for t in self.tasks:
-            if t.id == task_id:
-                return t
-        return None
+        return self._tasks.get(task_id)
 
+    @_mutation
     def mark_complete(self, task_id):
-        t = self.find(task_id)
+        t = self._tasks.get(task_id)
         if t:
+            self._unindex(t, text=False)
             t.status = "Completed"
-            self.save()
+            self._index(t, text=False)
+            self._commit([("put", t.to_dict())], "complete")
             return True
         return False
 
+    @_mutation
     def delete(self, task_id):
-        before = len(self.tasks)
-        self.tasks = [t for t in self.tasks if t.id != task_id]
-        if len(self.tasks) < before:
-            self.save()
-            return True
-        return False
+        t = self._tasks.pop(task_id, None)
+        if t is None:
+            return False
+        self._unindex(t)
+        self._commit([("del", task_id)])
+        return True
 
+    @_mutation
     def update(self, task_id, title=None, description=None, due_date=None):
-        t = self.find(task_id)
+        t = self._tasks.get(task_id)
         if not t:
             return False
+        self._unindex(t)
         if title is not None:
             t.title = title
         if description is not None:
             t.description = description
         if due_date is not None:
             t.due_date = due_date
-        self.save()
+        self._index(t)
+        self._commit([("put", t.to_dict())], "update")
         return True
 
-    def search(self, keyword):
-        k = keyword.lower()
-        return [t for t in self.tasks if k in t.title.lower() or k in t.description.lower()]
+    @_mutation
+    def add_many(self, items):
+        """Create tasks from dicts with ``title`` and optional ``description``/``due_date``.
+
+        Like the other ``*_many`` methods, every item is checked before anything
+        changes: if any is invalid, a ``BatchError`` mapping item positions to
+        messages is raised and nothing is applied. Otherwise all items are
+        applied and persisted with one commit.
+        """
+        errors = {}
+        for n, item in enumerate(items):
+            if not isinstance(item.get("title"), str) or not item["title"].strip():
+                errors[n] = "title is required"
+            elif not _valid_due(item.get("due_date")):
+                errors[n] = "due_date must be YYYY-MM-DD"
+        if errors:
+            raise BatchError(errors)
+        with self.batch():
+            return [self.add_task(item["title"], item.get("description") or "", item.get("due_date"))
+                    for item in items]
+
+    @_mutation
+    def update_many(self, items):
+        """Apply dicts with an ``id`` and any of ``title``/``description``/``due_date``."""
+        errors = self._check_ids([item.get("id") for item in items])
+        for n, item in enumerate(items):
+            if n in errors:
+                continue
+            if item.get("title") is not None and not str(item["title"]).strip():
+                errors[n] = "title must not be empty"
+            elif not _valid_due(item.get("due_date")):
+                errors[n] = "due_date must be YYYY-MM-DD"
+        if errors:
+            raise BatchError(errors)
+        with self.batch():
+            for item in items:
+                self.update(item["id"], item.get("title"), item.get("description"), item.get("due_date"))
+        return [self._tasks[item["id"]] for item in items]
+
+    @_mutation
+    def complete_many(self, task_ids):
+        errors = self._check_ids(task_ids)
+        if errors:
+            raise BatchError(errors)
+        with self.batch():
+            for task_id in task_ids:
+                self.mark_complete(task_id)
+        return [self._tasks[task_id] for task_id in task_ids]
+
+    @_mutation
+    def delete_many(self, task_ids):
+        errors = self._check_ids(task_ids)
+        if errors:
+            raise BatchError(errors)
+        with self.batch():
+            for task_id in task_ids:
+                self.delete(task_id)
+        return list(task_ids)
+
+    def _check_ids(self, task_ids):
+        errors, seen = {}, set()
+        for n, task_id in enumerate(task_ids):
+            if task_id not in self._tasks:
+                errors[n] = f"task {task_id} not found"
+            elif task_id in seen:
+                errors[n] = f"task {task_id} appears more than once"
+            seen.add(task_id)
+        return errors
+
+    def query(self, status=None, due_after=None, due_before=None, overdue=False,
+              sort="id", after_id=None, after_due=None, limit=None, today=None):
+        """Return one page of tasks, filtered and sorted.
+
+        ``due_after``/``due_before`` are exclusive YYYY-MM-DD bounds and
+        ``overdue`` keeps unfinished tasks due before ``today``. ``sort`` is one
+        of ``SORTS``; a leading ``-`` reverses it, and tasks without a due date
+        sort after dated ones. Pass the id of the last task of a page as
+        ``after_id`` to get the next one; with a due-date sort, also pass its
+        due date (``""`` if it had none) as ``after_due`` so the page can
+        resume even if that task has since been deleted.
+
+        Every filter is answered by an index (id, per-status, due-date,
+        per-status due-date or unfinished due-date), so a page sorted by the
+        index's own order costs O(log N + page). A due range sorted by id is
+        either sorted whole or found by walking the id index, whichever reads
+        fewer keys: at most about sqrt(page * N).
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort {sort!r}; choose from {', '.join(SORTS)}")
+        if limit is not None and limit < 0:
+            raise ValueError("limit must not be negative")
+        reverse = sort.startswith("-")
+        due_sort = sort.endswith("due_date")
+        if overdue:
+            today = today or date.today().isoformat()
+            due_before = min(due_before, today) if due_before else today
+        cursor = None
+        if after_id is not None and due_sort:
+            if after_due is not None:
+                cursor = _due_sort_key(_encode_date(after_due), after_id)
+            elif after_id in self._tasks:
+                cursor = _due_key(self._tasks[after_id])
+            else:
+                raise ValueError(f"task {after_id} no longer exists; pass its due date as after_due")
+        if due_sort or due_after is not None or due_before is not None:
+            lo = (0, _day(due_after, "due_after"), float("inf")) if due_after is not None else None
+            hi = (0, _day(due_before, "due_before"), float("-inf")) if due_before is not None else None
+            if hi is None and due_after is not None:
+                hi = (1,)
+            if lo is None and due_before is not None:
+                lo = (0,)
+            if not due_sort:
+                ids = self._due_range_by_id(status, overdue, lo, hi, reverse, after_id, limit)
+            else:
+                if cursor is not None:
+                    if reverse:
+                        hi = cursor if hi is None else min(hi, cursor)
+                    else:
+                        lo = cursor if lo is None else max(lo, cursor)
+                ids = (k[-1] for k in self._due_range(status, overdue, lo, hi, reverse))
+        else:
+            index = self._ids if status is None else self._status_index(status)
+            lo, hi = (None, after_id) if reverse else (after_id, None)
+            ids = index.range(lo, hi, reverse)
+        return [self._tasks[task_id] for task_id in islice(ids, limit)]
+
+    def _due_range(self, status, overdue, lo, hi, reverse=False):
+        """Due-date keys ``lo < key < hi`` of tasks with ``status`` (if given), unfinished ones if ``overdue``."""
+        if overdue and status is None:
+            # Exactly the unfinished tasks with a real due date, keyed (day, id) rather than (0, day, id).
+            lo, hi = _pending_bound(lo), _pending_bound(hi)
+            return ((0,) + k for k in self._pending_due_index().range(lo, hi, reverse))
+        if overdue and status == "Completed":
+            return iter(())
+        index = self._due_index() if status is None else self._status_due_index(status)
+        return index.range(lo, hi, reverse)
+
+    def _due_range_by_id(self, status, overdue, lo, hi, reverse, after_id, limit):
+        """Ids in a due range (see ``_due_range``) in id order, from after ``after_id``.
+
+        A range of R keys sorts in O(R log R); walking the id index instead
+        reads about page * N / R keys before the page is full. The range is
+        sorted when it has at most sqrt(page * N) keys, which reading that many
+        keys of it finds out.
+        """
+        index = self._ids if status is None else self._status_index(status)
+        keys = self._due_range(status, overdue, lo, hi)
+        if limit is not None:
+            cap = isqrt(max(limit, 1) * len(index)) + 1
+            head = list(islice(keys, cap + 1))
+            if len(head) > cap:
+                start, stop = (None, after_id) if reverse else (after_id, None)
+                return (task_id for task_id in index.range(start, stop, reverse)
+                        if self._in_due_range(self._tasks[task_id], overdue, lo, hi))
+            keys = head
+        ids = sorted(k[-1] for k in keys)
+        if after_id is not None:
+            ids = ids[:bisect_left(ids, after_id)] if reverse else ids[bisect_right(ids, after_id):]
+        return reversed(ids) if reverse else iter(ids)
+
+    @staticmethod
+    def _in_due_range(task, overdue, lo, hi):
+        return lo < _due_key(task) < hi and not (overdue and task.status == "Completed")
+
+    def due_between(self, first=None, last=None, limit=None):
+        """Unfinished tasks due from ``first`` through ``last`` (YYYY-MM-DD, either may be None), earliest first.
+
+        Tasks without a due date, or with one that isn't a valid date, are never included.
+        """
+        lo = (_day(first, "first"),) if first is not None else None
+        hi = (_day(last, "last") + 1,) if last is not None else None
+        page = []
+        for _, task_id in self._pending_due_index().range(lo, hi):
+            page.append(self._tasks[task_id])
+            if limit is not None and len(page) >= limit:
+                break
+        return page
+
+    def overdue(self, today=None, limit=None):
+        """Unfinished tasks due before ``today``, earliest first."""
+        today = _day(today or date.today().isoformat(), "today")
+        return self.due_between(last=date.fromordinal(today - 1).isoformat(), limit=limit)
+
+    def upcoming(self, days=7, today=None, limit=None):
+        """Unfinished tasks due from ``today`` through ``days`` days later, earliest first."""
+        if days < 0:
+            raise ValueError("days must not be negative")
+        start = date.fromordinal(_day(today or date.today().isoformat(), "today"))
+        return self.due_between(start.isoformat(), (start + timedelta(days=days)).isoformat(), limit)
+
+    def next_due(self, after):
+        """The first due date after ``after`` of any unfinished task, or None."""
+        key = next(self._pending_due_index().range((_day(after, "after") + 1,)), None)
+        return date.fromordinal(key[0]).isoformat() if key else None
+
+    @_timed("search")
+    def search(self, keyword, limit=None, mode="index"):
+        """Find tasks whose title or description matches ``keyword``.
+
+        ``mode="index"`` treats each word as a prefix, requires all of them and
+        ranks the hits; ``mode="substring"`` is the original case-insensitive
+        substring scan over every task.
+        """
+        if mode == "substring" or not tokenize(keyword):
+            k = keyword.lower()
+            hits = [t for t in self._tasks.values() if k in t.title.lower() or k in t.description.lower()]
+            return hits if limit is None else hits[:limit]
+        if mode != "index":
+            raise ValueError(f"Unknown search mode {mode!r}")
+        text = self._text_index()
+        if text is None:
+            ids = scan(keyword, ((t.id, t.title, t.description) for t in self._tasks.values()), limit)
+        else:
+            ids = text.search(keyword, limit)
+        return [self._tasks[i] for i in ids]
+
+def open_manager(backend=None, filepath=None):
+    """Build a TaskManager from ``TASKS_BACKEND`` (json, journal or sqlite) and ``TASKS_PATH``."""
+    backend = backend or os.environ.get("TASKS_BACKEND", "json")
+    filepath = filepath or os.environ.get("TASKS_PATH") or DEFAULT_PATHS.get(backend)
+    return TaskManager(filepath=filepath, storage=make_storage(backend, filepath))
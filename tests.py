@@ -1,7 +1,34 @@
+import asyncio
+import io
+import itertools
+import json
+from datetime import datetime
+import multiprocessing
 import os
 import tempfile
+import shutil
+import sys
+import threading
+import time
 import unittest
-from tasks import TaskManager
+from unittest import mock
+from cache import ResponseCache
+from groupcommit import GroupCommitter
+from tasks import Task, TaskManager, BatchError, open_manager
+from storage import SQLiteStorage
+from scheduler import ReminderScheduler
+from metrics import Registry, Counter, Histogram
+import tasks
+from benchmarks.data import generate, write_store
+import search
+import snapshot
+import cli
+import pool
+import storage
+from changes import ChangeFeed, ChangeLog, ResyncRequired
+import encoding
+import gzip
+from benchmarks.suite import compare
 
 class TestTaskManager(unittest.TestCase):
     def setUp(self):
@@ -30,5 +57,1451 @@ class TestTaskManager(unittest.TestCase):
         self.mgr.delete(t.id)
         self.assertIsNone(self.mgr.find(t.id))
 
+    def test_deleted_ids_are_not_reused(self):
+        self.mgr.add_task("a")
+        b = self.mgr.add_task("b")
+        self.mgr.delete(b.id)
+        self.assertEqual(self.mgr.add_task("c").id, b.id + 1)
+        c = self.mgr.find(b.id + 1)
+        self.mgr.delete(c.id)
+        mgr = TaskManager(filepath=self.path)
+        self.assertEqual(mgr.add_task("d").id, c.id + 1)
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.json")
+        self.mgr = TaskManager(filepath=self.path, journal=True)
+        self.commits = 0
+        commit = self.mgr.storage.commit
+        def counting_commit(ops, snapshot):
+            self.commits += 1
+            commit(ops, snapshot)
+        self.mgr.storage.commit = counting_commit
+
+    def tearDown(self):
+        self.mgr.close()
+        self.dir.cleanup()
+
+    def test_add_many_commits_once(self):
+        tasks = self.mgr.add_many([{"title": f"t{i}", "due_date": "2025-01-01"} for i in range(100)])
+        self.assertEqual([t.id for t in tasks], list(range(1, 101)))
+        self.assertEqual(self.commits, 1)
+        self.mgr.complete_many([1, 2])
+        self.mgr.update_many([{"id": 3, "title": "x"}])
+        self.mgr.delete_many([4, 5])
+        self.assertEqual(self.commits, 4)
+        self.mgr.close()
+        mgr = TaskManager(filepath=self.path, journal=True)
+        self.assertEqual(len(mgr), 98)
+        self.assertEqual(mgr.find(3).title, "x")
+        self.assertEqual(mgr.find(2).status, "Completed")
+        mgr.close()
+
+    def test_invalid_batch_applies_nothing(self):
+        self.mgr.add_many([{"title": "a"}, {"title": "b"}])
+        with self.assertRaises(BatchError) as cm:
+            self.mgr.add_many([{"title": "c"}, {"title": ""}, {"title": "d", "due_date": "tomorrow"}])
+        self.assertEqual(sorted(cm.exception.errors), [1, 2])
+        with self.assertRaises(BatchError) as cm:
+            self.mgr.delete_many([1, 99, 1])
+        self.assertEqual(sorted(cm.exception.errors), [1, 2])
+        self.assertEqual(len(self.mgr), 2)
+        self.assertEqual(self.commits, 1)
+
+def _add_tasks(backend, path, n):
+    mgr = open_manager(backend, path)
+    for i in range(n):
+        mgr.add_task(f"{os.getpid()}-{i}")
+    mgr.close()
+
+class TestMultiProcess(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def check_two_managers(self, backend):
+        path = os.path.join(self.dir.name, "tasks")
+        a = open_manager(backend, path)
+        b = open_manager(backend, path)
+        t1 = a.add_task("from a")
+        self.assertTrue(b.sync())
+        self.assertEqual(b.find(t1.id).title, "from a")
+        self.assertFalse(b.sync())
+        t2 = b.add_task("from b")
+        self.assertNotEqual(t1.id, t2.id)
+        b.update(t1.id, title="edited by b")
+        a.delete(t2.id)
+        b.sync()
+        self.assertEqual([t.title for t in a.get_all()], ["edited by b"])
+        self.assertEqual([t.title for t in b.get_all()], ["edited by b"])
+        a.close()
+        b.close()
+
+    def test_json(self):
+        self.check_two_managers("json")
+
+    def test_journal_applies_delta(self):
+        self.check_two_managers("journal")
+        path = os.path.join(self.dir.name, "delta")
+        a = open_manager("journal", path)
+        b = open_manager("journal", path)
+        a.add_task("x")
+        b._load = None  # a full reload would fail here
+        self.assertTrue(b.sync())
+        a.close()
+
+    def test_journal_follows_compaction(self):
+        path = os.path.join(self.dir.name, "tasks")
+        a = open_manager("journal", path)
+        b = open_manager("journal", path)
+        a.add_task("one")
+        a.compact()
+        b.add_task("two")
+        a.sync()
+        self.assertEqual(len(a), 2)
+        a.close()
+        b.close()
+        self.assertEqual(len(open_manager("journal", path)), 2)
+
+    def test_own_writes_never_force_a_reload(self):
+        for backend in ("json", "journal", "binary"):
+            mgr = open_manager(backend, os.path.join(self.dir.name, "own-" + backend))
+            pollers, polls, real_replace = [], [], os.replace
+
+            def replace(src, dst):
+                real_replace(src, dst)
+                if dst == mgr.storage.filepath:
+                    # A poll landing mid-swap must wait for it and then see nothing new.
+                    pollers.append(threading.Thread(target=lambda: polls.append(mgr.storage.poll())))
+                    pollers[-1].start()
+                    pollers[-1].join(0.05)
+
+            with mock.patch.object(mgr, "_load", side_effect=AssertionError("reloaded")), \
+                    mock.patch("storage.os.replace", replace):
+                mgr.add_task("a")
+                # Journal stores start without a snapshot; compaction writes the first one.
+                mgr.compact()
+                mgr.add_task("b")
+                mgr.compact()
+                self.assertFalse(mgr.sync())
+            for t in pollers:
+                t.join()
+            self.assertEqual(polls, [[]] * len(pollers))
+            self.assertTrue(polls)
+            mgr.close()
+
+    def test_windows_file_lock(self):
+        msvcrt = mock.Mock(LK_UNLCK=0, LK_LOCK=1, LK_NBLCK=2)
+        # A blocking lock keeps retrying past LK_LOCK's own timeout.
+        msvcrt.locking.side_effect = [OSError, None, None, OSError]
+        lock = storage.FileLock(os.path.join(self.dir.name, "win.lock"))
+        with mock.patch.object(storage, "fcntl", None), mock.patch.object(storage, "msvcrt", msvcrt, create=True):
+            with lock:
+                self.assertTrue(lock.acquire())  # re-entrant: no second OS lock
+                lock.release()
+            self.assertFalse(lock.acquire(blocking=False))
+        lock.close()
+        self.assertEqual([c.args[1:] for c in msvcrt.locking.call_args_list], [(1, 1), (1, 1), (0, 1), (2, 1)])
+
+    def test_sqlite(self):
+        self.check_two_managers("sqlite")
+
+    def test_concurrent_processes(self):
+        path = os.path.join(self.dir.name, "tasks")
+        ctx = multiprocessing.get_context("fork")
+        for backend in ("journal", "sqlite"):
+            procs = [ctx.Process(target=_add_tasks, args=(backend, path + backend, 25)) for _ in range(4)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            mgr = open_manager(backend, path + backend)
+            self.assertEqual(sorted(t.id for t in mgr.get_all()), list(range(1, 101)))
+
+class TestVersions(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_versions_advance_per_commit(self):
+        mgr = open_manager("journal", self.path)
+        a = mgr.add_task("a")
+        b = mgr.add_task("b")
+        self.assertEqual(mgr.version, 2)
+        self.assertEqual((mgr.task_version(a.id), mgr.task_version(b.id)), (1, 2))
+        mgr.add_many([{"title": "c"}, {"title": "d"}])
+        self.assertEqual(mgr.version, 3)
+        mgr.close()
+        reloaded = open_manager("journal", self.path)
+        self.assertEqual(reloaded.version, 3)
+        reloaded.update(a.id, title="a2")
+        self.assertEqual(reloaded.task_version(a.id), 4)
+        reloaded.close()
+
+    def test_version_moves_with_the_change(self):
+        mgr = open_manager("journal", self.path)
+        with mgr.batch():
+            a = mgr.add_task("a")
+            # Readers holding mgr.lock see the new version as soon as the change is visible, not at commit.
+            self.assertEqual((mgr.version, mgr.task_version(a.id)), (1, 1))
+            mgr.add_task("b")
+            self.assertEqual(mgr.version, 1)
+        self.assertEqual(mgr.storage.meta["version"], 1)
+        mgr.close()
+
+    def test_other_process_changes_bump_version(self):
+        a = open_manager("sqlite", self.path)
+        b = open_manager("sqlite", self.path)
+        t = a.add_task("a")
+        b.sync()
+        self.assertEqual(b.version, a.version)
+        self.assertEqual(b.task_version(t.id), a.task_version(t.id))
+
+    def test_response_cache(self):
+        cache = ResponseCache(maxsize=2)
+        cache.put("a", 1, b"A")
+        cache.put("b", 1, b"B")
+        self.assertEqual(cache.get("a", 1), b"A")
+        self.assertIsNone(cache.get("a", 2))
+        cache.put("c", 1, b"C")
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual(len(cache), 2)
+
+class TestGroupCommit(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.json")
+        self.mgr = TaskManager(filepath=self.path, journal=True)
+
+    def tearDown(self):
+        self.mgr.close()
+        self.dir.cleanup()
+
+    def test_concurrent_writes_share_commits(self):
+        commits = []
+        commit = self.mgr.storage.commit
+        self.mgr.storage.commit = lambda ops, snapshot: (commits.append(len(ops)), commit(ops, snapshot))
+        committer = GroupCommitter(self.mgr, window=0.05)
+
+        async def run():
+            adds = [committer.submit(self.mgr.add_task, f"t{i}") for i in range(50)]
+            tasks = await asyncio.gather(*adds)
+            with self.assertRaises(KeyError):
+                await committer.submit(lambda: {}["missing"])
+            return tasks
+
+        tasks = asyncio.run(run())
+        committer.stop()
+        self.assertEqual(sorted(t.id for t in tasks), list(range(1, 51)))
+        self.assertLess(len(commits), 50)
+        self.mgr.close()
+        self.assertEqual(len(TaskManager(filepath=self.path, journal=True)), 50)
+
+class TestNDJSON(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "a.json"))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        self.mgr.add_many([{"title": f"t{i}", "due_date": "2025-01-02"} for i in range(25)])
+        self.mgr.delete(3)
+        self.mgr.mark_complete(4)
+        lines = list(self.mgr.export_ndjson(page_size=10))
+        self.assertEqual(len(lines), 24)
+        other = TaskManager(filepath=os.path.join(self.dir.name, "b.json"))
+        stats = other.import_ndjson(lines, chunk_size=7)
+        self.assertEqual((stats["imported"], stats["failed"]), (24, 0))
+        self.assertEqual([t.to_dict() for t in other.get_all()], [t.to_dict() for t in self.mgr.get_all()])
+        self.assertEqual(other.add_task("next").id, 26)
+
+    def test_export_survives_deleting_the_page_cursor(self):
+        self.mgr.add_many([{"title": f"t{i}"} for i in range(24)])
+        export = self.mgr.export_ndjson(page_size=10)
+        lines = [next(export) for _ in range(10)]
+        self.mgr.delete(10)
+        self.mgr.delete(15)
+        lines += list(export)
+        self.assertEqual([json.loads(line)["id"] for line in lines], [i for i in range(1, 25) if i != 15])
+
+    def test_bad_lines_are_reported(self):
+        stats = self.mgr.import_ndjson([
+            '{"title": "ok"}',
+            "not json",
+            "",
+            '{"title": "bad date", "due_date": "soon"}',
+            '{"id": 10, "title": "kept id"}',
+            b'{"title": "caf\xe9"}',
+        ])
+        self.assertEqual((stats["imported"], stats["failed"]), (2, 3))
+        self.assertTrue(stats["errors"][0].startswith("line 2:"))
+        self.assertTrue(stats["errors"][1].startswith("line 4:"))
+        self.assertEqual(stats["errors"][2], "line 6: not valid UTF-8")
+        self.assertEqual(self.mgr.find(10).title, "kept id")
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "a.json"))
+        self.commits = []
+        commit = self.mgr.storage.commit
+        self.mgr.storage.commit = lambda ops, snapshot: (self.commits.append(len(ops)), commit(ops, snapshot))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_lines(self, lines, every=0):
+        out = io.StringIO()
+        stats = cli.run_batch(self.mgr, lines, every, out=out)
+        return stats, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_batch_commits_once(self):
+        stats, results = self.run_lines([
+            'add "Write report" --due 2025-03-01',
+            '{"op": "add", "title": "Call client", "description": "about the invoice"}',
+            "# comment",
+            "",
+            "complete 1",
+            '{"op": "update", "id": 2, "title": "Call the client"}',
+            "delete 9",
+            "add --due tomorrow late",
+            "list --status Pending",
+            '{"op": "search", "keyword": "invoice", "limit": 5}',
+        ])
+        self.assertEqual(stats, {"commands": 8, "failed": 2})
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual([r["line"] for r in results], [1, 2, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(results[2]["task"]["status"], "Completed")
+        self.assertEqual(results[4], {"line": 7, "ok": False, "id": 9, "error": "not found"})
+        self.assertFalse(results[5]["ok"])
+        self.assertEqual([t["title"] for t in results[6]["tasks"]], ["Call the client"])
+        self.assertEqual([t["id"] for t in results[7]["tasks"]], [2])
+        reopened = TaskManager(filepath=self.mgr.filepath)
+        self.assertEqual([t.title for t in reopened.get_all()], ["Write report", "Call the client"])
+
+    def test_json_lines_need_their_positionals(self):
+        stats, results = self.run_lines(['{"op": "add"}', '{"op": "complete", "id": null}', '{"op": "list"}'])
+        self.assertEqual(stats, {"commands": 3, "failed": 2})
+        self.assertEqual(results[0], {"line": 1, "ok": False, "error": "add needs 'title'"})
+        self.assertEqual(len(self.mgr), 0)
+
+    def test_every_must_not_be_negative(self):
+        with mock.patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+            cli.main(["batch", "--every", "-1"])
+
+    def test_limit_must_not_be_negative(self):
+        self.run_lines(["add a", "add b"])
+        _, out = self.run_lines(["list --limit 0", "search a --limit 0", "list --limit 1"])
+        self.assertEqual([len(r["tasks"]) for r in out], [0, 0, 1])
+        with mock.patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+            cli.main(["list", "--limit", "-1"])
+
+    def test_batch_commits_every_n(self):
+        stats, _ = self.run_lines([f"add t{i}" for i in range(10)], every=4)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(len(self.commits), 3)
+        self.assertEqual(len(self.mgr), 10)
+
+class TestEncoding(unittest.TestCase):
+    def setUp(self):
+        self.tasks = [Task.from_dict(d) for d in generate(25)]
+        self.tasks[0].title = "naïve \"quoted\" ✓"
+
+    def test_matches_task_dicts(self):
+        expected = [t.to_dict() for t in self.tasks]
+        self.assertEqual(json.loads(encoding.encode_tasks(self.tasks)), expected)
+        self.assertEqual(json.loads(encoding.encode_task(self.tasks[0])), expected[0])
+        lock = threading.RLock()
+        chunks = list(encoding.iter_encode_tasks(self.tasks, lock, chunk_size=10))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b"".join(chunks), encoding.encode_tasks(self.tasks))
+        self.assertEqual(b"".join(encoding.iter_encode_tasks([], lock)), b"[]")
+
+    def test_stdlib_fallback_gives_same_bytes(self):
+        fast = encoding.encode_tasks(self.tasks)
+        orjson, encoding.orjson = encoding.orjson, None
+        try:
+            self.assertEqual(encoding.encode_tasks(self.tasks), fast)
+        finally:
+            encoding.orjson = orjson
+
+    def test_gzip(self):
+        body = encoding.encode_tasks(self.tasks)
+        self.assertEqual(gzip.decompress(encoding.gzip_body(body)), body)
+        self.assertEqual(gzip.decompress(b"".join(encoding.gzip_stream([body[:100], b"", body[100:]]))), body)
+        self.assertTrue(encoding.accepts_gzip("gzip, deflate, br"))
+        self.assertTrue(encoding.accepts_gzip("br;q=1.0, *;q=0.5"))
+        self.assertFalse(encoding.accepts_gzip("gzip;q=0, *"))
+        self.assertFalse(encoding.accepts_gzip("identity"))
+        self.assertFalse(encoding.accepts_gzip(None))
+
+class TestChanges(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.json")
+        self.mgr = TaskManager(storage=tasks.make_storage("journal", self.path))
+
+    def tearDown(self):
+        self.mgr.close()
+        self.dir.cleanup()
+
+    def ops(self, since):
+        changes, seq = self.mgr.changes.since(since)
+        return [(op, task_id) for _, op, task_id, _ in changes], seq
+
+    def test_mutations_are_logged_in_order(self):
+        start = self.mgr.changes.seq
+        a = self.mgr.add_task("a")
+        self.mgr.mark_complete(a.id)
+        self.mgr.update(a.id, title="b")
+        self.mgr.add_many([{"title": "c"}, {"title": "d"}])
+        self.mgr.delete(a.id)
+        self.assertEqual(self.ops(start), ([("create", 1), ("complete", 1), ("update", 1), ("create", 2),
+                                            ("create", 3), ("delete", 1)], self.mgr.version))
+        changes, seq = self.mgr.changes.since(start + 3)
+        self.assertEqual({n for n, *_ in changes}, {start + 4, start + 5})
+        self.assertEqual(changes[0][3]["title"], "c")
+        # A limit never splits the batch commit.
+        changes, seq = self.mgr.changes.since(start, limit=4)
+        self.assertEqual((len(changes), seq), (3, start + 3))
+
+    def test_other_processes_changes(self):
+        self.mgr.add_task("a")
+        seq = self.mgr.changes.seq
+        other = TaskManager(storage=tasks.make_storage("journal", self.path))
+        other.add_task("b")
+        other.mark_complete(1)
+        other.delete(2)
+        other.close()
+        self.mgr.sync()
+        self.assertEqual(self.ops(seq)[0], [("create", 2), ("complete", 1), ("delete", 2)])
+
+    def test_resync_outside_retention(self):
+        log = ChangeLog(retention=8)
+        for seq in range(1, 21):
+            log.extend(seq, [("update", seq, {})])
+        self.assertLessEqual(len(log), 10)
+        with self.assertRaises(ResyncRequired) as caught:
+            log.since(1)
+        self.assertEqual(caught.exception.seq, 20)
+        self.assertEqual([n for n, *_ in log.since(log.floor)[0]], list(range(log.floor + 1, 21)))
+        with self.assertRaises(ResyncRequired):
+            log.since(21)
+        log.reset(30)
+        with self.assertRaises(ResyncRequired):
+            log.since(20)
+        self.assertEqual(log.since(30), ([], 30))
+
+class TestManagerPool(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.pool = pool.ManagerPool(os.path.join(self.dir.name, "lists"), "journal", max_open=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.dir.cleanup()
+
+    def add(self, list_id, *titles):
+        with self.pool.use(list_id) as mgr:
+            for title in titles:
+                mgr.add_task(title, due_date="2024-01-01")
+
+    def test_lru_eviction_flushes(self):
+        self.add("a", "a1", "a2")
+        self.add("b", "b1")
+        self.add("a", "a3")
+        self.add("c", "c1")
+        # b was least recently used.
+        self.assertEqual(sorted(self.pool._entries), ["a", "c"])
+        self.assertEqual(self.pool.evictions, 1)
+        self.assertEqual(os.path.getsize(self.pool.path("b") + ".log"), 0)
+        with self.pool.use("b", create=False) as mgr:
+            self.assertEqual([t.title for t in mgr.get_all()], ["b1"])
+        self.assertEqual(self.pool.list_ids(), ["a", "b", "c"])
+
+    def test_lists_in_use_are_not_evicted(self):
+        held = self.pool.acquire("a")
+        self.add("b", "b1")
+        self.add("c", "c1")
+        self.add("d", "d1")
+        self.assertIn("a", self.pool._entries)
+        self.assertIs(self.pool.acquire("a"), held)
+        self.pool.release(held)
+        self.pool.release(held)
+
+    def test_memory_cap(self):
+        capped = pool.ManagerPool(self.pool.root, "journal", max_open=10, max_bytes=pool.TASK_BYTES * 5)
+        try:
+            with capped.use("big") as mgr:
+                mgr.add_many([{"title": f"t{i}"} for i in range(4)])
+            with capped.use("small") as mgr:
+                mgr.add_many([{"title": f"t{i}"} for i in range(2)])
+            self.assertEqual(list(capped._entries), ["big", "small"])
+            # The budget is checked whenever a list is acquired.
+            with capped.use("small"):
+                pass
+            self.assertEqual(list(capped._entries), ["small"])
+        finally:
+            capped.close()
+
+    def test_map_and_missing_lists(self):
+        self.add("a", "report", "call")
+        self.add("b", "report")
+        self.add("c", "email")
+        found = self.pool.map(lambda mgr: [t.title for t in mgr.search("report")])
+        self.assertEqual(found, {"a": ["report"], "b": ["report"], "c": []})
+        self.assertEqual(self.pool.map(len, ["a", "zzz"]), {"a": 2})
+        with self.assertRaises(KeyError):
+            self.pool.acquire("zzz", create=False)
+        for bad in ("../x", "a.b", "", "x\n"):
+            with self.assertRaises(ValueError):
+                self.pool.path(bad)
+
+    def test_read_only_evictions_skip_compaction(self):
+        for list_id in "abcde":
+            self.add(list_id, list_id + "1")
+        # The first pass evicts the lists just written to, which do have journal entries to fold in.
+        self.pool.map(len)
+        with mock.patch("storage.replace_atomic", wraps=storage.replace_atomic) as replace:
+            for _ in range(3):
+                self.assertEqual(self.pool.map(len), dict.fromkeys("abcde", 1))
+        self.assertGreater(self.pool.evictions, 5)
+        replace.assert_not_called()
+
+    def test_eviction_closes_sqlite_connections(self):
+        lite = pool.ManagerPool(os.path.join(self.dir.name, "sqlite"), "sqlite", max_open=1)
+        try:
+            for n in range(6):
+                with lite.use(f"l{n}") as mgr:
+                    mgr.add_task("t")
+            open_dbs = [path for path, pid in storage._connections if path.startswith(lite.root)]
+            self.assertEqual(open_dbs, [os.path.abspath(lite.path("l5"))])
+            with lite.use("l0", create=False) as mgr:
+                self.assertEqual([t.title for t in mgr.get_all()], ["t"])
+        finally:
+            lite.close()
+        self.assertFalse([path for path, pid in storage._connections if path.startswith(lite.root)])
+
+    def test_reload_waits_for_eviction(self):
+        self.add("a", "a1")
+        entry = self.pool._entries["a"]
+        real_close, started, proceed = entry.manager.close, threading.Event(), threading.Event()
+
+        def slow_close():
+            started.set()
+            proceed.wait(5)
+            real_close()
+
+        entry.manager.close = slow_close
+        evicting = threading.Thread(target=lambda: (self.add("b", "b1"), self.add("c", "c1")))
+        evicting.start()
+        self.assertTrue(started.wait(5))
+        loaded = []
+        reload = threading.Thread(target=lambda: loaded.append(self.pool.acquire("a", create=False)))
+        reload.start()
+        reload.join(0.1)
+        self.assertTrue(reload.is_alive())
+        proceed.set()
+        evicting.join()
+        reload.join()
+        self.assertIsNot(loaded[0], entry)
+        self.assertEqual([t.title for t in loaded[0].manager.get_all()], ["a1"])
+        self.pool.release(loaded[0])
+
+def load_api():
+    """Import api.py with its module-level stores in a scratch dir; APITestCase swaps in its own per test."""
+    if "api" not in sys.modules:
+        scratch = tempfile.mkdtemp()
+        unittest.addModuleCleanup(shutil.rmtree, scratch, True)
+        with mock.patch.dict(os.environ, {"TASKS_BACKEND": "json", "TASKS_PATH": os.path.join(scratch, "tasks.json"),
+                                          "TASKS_LISTS_DIR": os.path.join(scratch, "lists")}):
+            import api
+    return sys.modules["api"]
+
+class APITestCase(unittest.TestCase):
+    """Runs requests through the app against a fresh store, committer, list pool and response cache."""
+
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        self.api = load_api()
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "tasks.json"))
+        self.pool = pool.ManagerPool(os.path.join(self.dir.name, "lists"), commit_window=0)
+        for name, value in {"task_manager": self.mgr, "committer": GroupCommitter(self.mgr, window=0),
+                            "pool": self.pool, "change_feed": ChangeFeed(self.mgr.changes),
+                            "response_cache": ResponseCache(64)}.items():
+            patcher = mock.patch.object(self.api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(self.api.app)
+
+    def tearDown(self):
+        self.api.committer.stop()
+        self.pool.close()
+        self.mgr.close()
+        self.dir.cleanup()
+
+class TestAPIQuery(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for n in range(1, 11):
+            self.mgr.add_task(f"t{n}", due_date=None if n % 4 == 0 else f"2025-01-{11 - n:02d}")
+        self.mgr.mark_complete(3)
+
+    def walk(self, **params):
+        ids, params = [], {"limit": 3, **params}
+        while True:
+            response = self.client.get("/tasks", params=params)
+            self.assertEqual(response.status_code, 200)
+            ids += [t["id"] for t in response.json()]
+            if "X-Next-After-Id" not in response.headers:
+                return ids
+            params["after_id"] = response.headers["X-Next-After-Id"]
+            if "X-Next-After-Due" in response.headers:
+                params["after_due"] = response.headers["X-Next-After-Due"]
+
+    def test_pages_follow_next_after_id(self):
+        self.assertEqual(self.walk(), list(range(1, 11)))
+        self.assertEqual(self.walk(sort="-id", status="Pending"), [10, 9, 8, 7, 6, 5, 4, 2, 1])
+        self.assertEqual(self.walk(due_after="2025-01-04"), [1, 2, 3, 5, 6])
+        self.assertEqual(self.walk(sort="due_date", due_before="2025-01-08"), [10, 9, 7, 6, 5])
+        self.assertEqual(self.walk(sort="due_date"), [10, 9, 7, 6, 5, 3, 2, 1, 4, 8])
+        self.assertEqual(self.walk(overdue=True, sort="-due_date"), [1, 2, 5, 6, 7, 9, 10])
+
+    def test_due_cursor_after_delete(self):
+        first = self.client.get("/tasks", params={"sort": "due_date", "limit": 2})
+        self.assertEqual(first.headers["X-Next-After-Id"], "9")
+        self.mgr.delete(9)
+        params = {"sort": "due_date", "after_id": 9}
+        self.assertEqual(self.client.get("/tasks", params=params).status_code, 422)
+        params["after_due"] = first.headers["X-Next-After-Due"]
+        self.assertEqual([t["id"] for t in self.client.get("/tasks", params=params).json()][:2], [7, 6])
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get("/tasks", params={"sort": "title"}).status_code, 422)
+        self.assertEqual(self.client.get("/tasks", params={"due_after": "soon"}).status_code, 422)
+        self.assertEqual(self.client.get("/tasks", params={"limit": 0}).status_code, 422)
+
+class TestAPIImport(APITestCase):
+    def test_bad_lines_are_counted(self):
+        body = b'{"title": "a"}\n{"title": "\xff"}\nnope\n{"title": "b"}'
+        response = self.client.post("/tasks/import", content=body)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual((stats["imported"], stats["failed"]), (2, 2))
+        self.assertEqual(stats["errors"][0], "line 2: not valid UTF-8")
+        response = self.client.get("/tasks/export")
+        self.assertEqual([json.loads(line)["title"] for line in response.text.splitlines()], ["a", "b"])
+
+class TestAPIBatch(APITestCase):
+    def test_batch_endpoints(self):
+        items = [{"title": "a"}, {"title": "b", "due_date": "2025-01-02"}]
+        response = self.client.post("/tasks/batch", json={"items": items})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([(r["index"], r["ok"], r["error"], r["task"]["title"]) for r in results],
+                         [(0, True, None, "a"), (1, True, None, "b")])
+        self.assertEqual(results[1]["task"]["due_date"], "2025-01-02")
+        response = self.client.post("/tasks/batch/update", json={"items": [{"id": 1, "title": "a2"}]})
+        self.assertEqual(response.json()["results"][0]["task"]["title"], "a2")
+        response = self.client.post("/tasks/batch/complete", json={"ids": [1, 2]})
+        self.assertEqual([r["task"]["status"] for r in response.json()["results"]], ["Completed"] * 2)
+        response = self.client.post("/tasks/batch/delete", json={"ids": [2]})
+        self.assertEqual(response.json()["results"], [{"index": 0, "ok": True, "error": None, "task": None}])
+        self.assertEqual([t.title for t in self.mgr.get_all()], ["a2"])
+
+    def test_invalid_items_are_reported_and_nothing_applied(self):
+        version = self.mgr.version
+        response = self.client.post("/tasks/batch", json={"items": [{"title": "ok"}, {"title": " "},
+                                                                     {"title": "x", "due_date": "soon"}]})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["results"], [
+            {"index": 0, "ok": False, "error": None, "task": None},
+            {"index": 1, "ok": False, "error": "title is required", "task": None},
+            {"index": 2, "ok": False, "error": "due_date must be YYYY-MM-DD", "task": None}])
+        response = self.client.post("/tasks/batch/delete", json={"ids": [7]})
+        self.assertEqual(response.json()["results"][0]["error"], "task 7 not found")
+        self.assertEqual((len(self.mgr), self.mgr.version), (0, version))
+
+    def test_invalid_batch_is_documented(self):
+        paths = self.client.get("/openapi.json").json()["paths"]
+        for path in ["/tasks/batch", "/tasks/batch/update", "/tasks/batch/complete", "/tasks/batch/delete"]:
+            schema = paths[path]["post"]["responses"]["422"]["content"]["application/json"]["schema"]
+            self.assertEqual(schema, {"$ref": "#/components/schemas/BatchResponse"})
+
+    def test_batch_size_limit(self):
+        limit = self.api.MAX_BATCH_SIZE
+        self.assertEqual(self.client.post("/tasks/batch/delete", json={"ids": list(range(limit + 1))}).status_code, 422)
+        response = self.client.post("/tasks/batch", json={"items": [{"title": "t"}] * limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.mgr), limit)
+
+class TestAPIConditional(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.mgr.add_task("alpha one")
+        self.mgr.add_task("alpha two")
+
+    def check(self, path, change):
+        first = self.client.get(path)
+        etag = first.headers["ETag"]
+        again = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual((again.status_code, again.headers["ETag"], again.content), (304, etag, b""))
+        self.assertEqual(self.client.get(path).json(), first.json())
+        self.assertEqual(change().status_code, 200)
+        after = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after.headers["ETag"], etag)
+        self.assertNotEqual(after.json(), first.json())
+        return after.json()
+
+    def test_task_list(self):
+        body = self.check("/tasks", lambda: self.client.post("/tasks", json={"title": "alpha three"}))
+        self.assertEqual(len(body), 3)
+
+    def test_single_task(self):
+        body = self.check("/tasks/1", lambda: self.client.put("/tasks/1", json={"title": "renamed"}))
+        self.assertEqual(body["title"], "renamed")
+        # Another task's change leaves this one's ETag alone.
+        etag = self.client.get("/tasks/1").headers["ETag"]
+        self.client.patch("/tasks/2/complete")
+        self.assertEqual(self.client.get("/tasks/1", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.client.get("/tasks/9").status_code, 404)
+
+    def test_search(self):
+        body = self.check("/tasks/search/alpha", lambda: self.client.delete("/tasks/2"))
+        self.assertEqual([t["id"] for t in body], [1])
+
+class TestAPIConcurrency(APITestCase):
+    def test_readers_and_writers_do_not_deadlock(self):
+        # Another writer on the same file makes every sync here a full reload, which takes the store lock.
+        other = TaskManager(filepath=self.mgr.filepath)
+        self.addCleanup(other.close)
+        stop, errors = threading.Event(), []
+
+        def loop(step):
+            try:
+                while not stop.is_set():
+                    step()
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        steps = [lambda: self.client.get("/tasks"), lambda: self.client.get("/changes"),
+                 lambda: self.client.get("/tasks/search/task"),
+                 lambda: self.client.post("/tasks", json={"title": "task api"}),
+                 lambda: other.add_task("task other")]
+        threads = [threading.Thread(target=loop, args=(step,), daemon=True) for step in steps]
+        for t in threads:
+            t.start()
+        time.sleep(1)
+        stop.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual([t for t in threads if t.is_alive()], [])
+        self.assertEqual(errors, [])
+        other.sync()
+        self.mgr.sync()
+        self.assertEqual(len(self.mgr), len(other))
+
+class TestAPIEncoding(APITestCase):
+    def test_gzip_is_negotiated(self):
+        self.mgr.add_many([{"title": f"task number {i}", "description": "x" * 40} for i in range(30)])
+        plain = self.client.get("/tasks", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+        zipped = self.client.get("/tasks", headers={"Accept-Encoding": "gzip;q=0.5, br"})
+        self.assertEqual(zipped.headers["Content-Encoding"], "gzip")
+        self.assertLess(zipped.num_bytes_downloaded, len(plain.content))
+        self.assertEqual(zipped.json(), plain.json())
+        refused = self.client.get("/tasks", headers={"Accept-Encoding": "gzip;q=0, *"})
+        self.assertNotIn("Content-Encoding", refused.headers)
+        small = self.client.get("/tasks/1", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", small.headers)
+        self.assertNotIn("Accept-Encoding", small.headers.get("Vary", ""))
+
+    def test_long_lists_are_streamed(self):
+        # Past STREAM_MIN, and more than two chunks of encoding.CHUNK_SIZE.
+        self.mgr.add_many([{"title": f"t{i}"} for i in range(self.api.STREAM_MIN + 500)])
+        expected = [t.to_dict() for t in self.mgr.get_all()]
+        for accept in ("identity", "gzip"):
+            self.api.response_cache.clear()
+            response = self.client.get("/tasks", headers={"Accept-Encoding": accept})
+            self.assertNotIn("Content-Length", response.headers)
+            self.assertEqual(response.headers.get("Content-Encoding"), "gzip" if accept == "gzip" else None)
+            self.assertEqual(response.json(), expected)
+        # The streamed body was cached whole once it had been sent.
+        hits = self.api.response_cache.hits
+        cached = self.client.get("/tasks", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual((self.api.response_cache.hits, cached.json()), (hits + 1, expected))
+        self.assertIn("Content-Length", cached.headers)
+        self.assertEqual(self.client.get("/tasks", params={"limit": 5}).json(), expected[:5])
+
+class TestAPIChanges(APITestCase):
+    def test_changes_since(self):
+        start = self.client.get("/changes").json()
+        self.assertEqual(start, {"seq": 0, "changes": [], "more": False})
+        self.client.post("/tasks", json={"title": "a"})
+        self.client.post("/tasks/batch", json={"items": [{"title": "b"}, {"title": "c"}]})
+        self.client.delete("/tasks/1")
+        body = self.client.get("/changes", params={"since": 0, "limit": 2}).json()
+        # Whole commits only: the two-task batch doesn't fit after the first create.
+        self.assertEqual(([(c["seq"], c["op"], c["id"]) for c in body["changes"]], body["seq"], body["more"]),
+                         ([(1, "create", 1)], 1, True))
+        body = self.client.get("/changes", params={"since": 1}).json()
+        self.assertEqual([(c["seq"], c["op"], c["id"]) for c in body["changes"]],
+                         [(2, "create", 2), (2, "create", 3), (3, "delete", 1)])
+        self.assertEqual((body["seq"], body["more"], body["changes"][0]["task"]["title"]), (3, False, "b"))
+
+    def test_resync_is_410(self):
+        self.mgr.changes.retention = 4
+        self.mgr.add_many([{"title": f"t{i}"} for i in range(3)])
+        for i in range(3):
+            self.mgr.add_task(f"more{i}")
+        response = self.client.get("/changes", params={"since": 0})
+        self.assertEqual((response.status_code, response.json()["seq"]), (410, 4))
+        self.assertEqual(self.client.get("/changes", params={"since": 1}).status_code, 200)
+        self.assertEqual(self.client.get("/changes", params={"since": 99}).status_code, 410)
+
+    def first_event(self, last_event_id):
+        # Called directly: the stream never ends, which TestClient can't cut short.
+        from starlette.requests import Request
+        request = Request({"type": "http", "method": "GET", "path": "/changes/stream", "query_string": b"",
+                           "headers": [(b"last-event-id", last_event_id.encode())]})
+
+        async def read():
+            response = await self.api.stream_changes(request, since=None)
+            events = response.body_iterator
+            try:
+                return await events.__anext__()
+            finally:
+                await events.aclose()
+        return asyncio.run(read())
+
+    def test_stream_resumes_from_last_event_id(self):
+        for title in "abc":
+            self.mgr.add_task(title)
+        event = self.first_event("1").splitlines()
+        self.assertEqual(event[:2], ["id: 3", "event: changes"])
+        body = json.loads(event[2].removeprefix("data: "))
+        self.assertEqual([c["id"] for c in body["changes"]], [2, 3])
+        self.mgr.changes.reset(self.mgr.version)
+        self.assertEqual(self.first_event("1"), 'event: resync\ndata: {"seq":3}\n\n')
+
+class TestAPIMetrics(APITestCase):
+    def test_requests_are_labelled_by_route_template(self):
+        requests = self.api.REQUESTS._values
+        before = {key: requests.get(key, 0) for key in [("GET", "/tasks/{task_id}", "200"),
+                                                        ("GET", "/tasks/{task_id}", "404"),
+                                                        ("GET", "unmatched", "404")]}
+        self.mgr.add_task("a")
+        in_flight = []
+        real_find = self.mgr.find
+
+        def find(task_id):
+            in_flight.append(self.api.IN_FLIGHT._values[()])
+            return real_find(task_id)
+
+        with mock.patch.object(self.mgr, "find", find):
+            self.client.get("/tasks/1")
+            self.client.get("/tasks/2")
+        self.client.get("/no/such/path")
+        self.assertEqual([requests.get(key, 0) - n for key, n in before.items()], [1, 1, 1])
+        self.assertEqual(in_flight[0], 1)
+        self.assertEqual(self.api.IN_FLIGHT._values[()], 0)
+        text = self.client.get("/metrics").text
+        self.assertIn('tasks_http_requests_total{method="GET",route="/tasks/{task_id}",status="404"}', text)
+        self.assertIn("tasks_http_requests_in_flight 1", text)  # the /metrics request itself
+        self.assertIn("tasks_store_tasks 1", text)
+
+class TestAPILists(APITestCase):
+    def test_list_crud(self):
+        created = self.client.post("/lists/work/tasks", json={"title": "report", "due_date": "2024-01-01"})
+        self.assertEqual(created.status_code, 200)
+        task_id = created.json()["id"]
+        base = f"/lists/work/tasks/{task_id}"
+        self.assertEqual(self.client.get(base).json()["title"], "report")
+        self.assertEqual(self.client.put(base, json={"title": "final report"}).json()["title"], "final report")
+        self.assertEqual(self.client.patch(base + "/complete").json()["status"], "Completed")
+        self.assertEqual([t["title"] for t in self.client.get("/lists/work/tasks").json()], ["final report"])
+        self.assertEqual(self.client.delete(base).status_code, 200)
+        self.assertEqual(self.client.get(base).status_code, 404)
+        # Lists are separate from each other and from the default store.
+        self.assertEqual(self.client.get("/tasks").json(), [])
+
+    def test_missing_and_reserved_lists(self):
+        self.assertEqual(self.client.get("/lists/nope/tasks").status_code, 404)
+        self.assertEqual(self.client.get("/lists/nope/tasks/1").status_code, 404)
+        self.assertEqual(self.client.delete("/lists/nope/tasks/1").status_code, 404)
+        self.assertFalse(self.pool.exists("nope"))
+        self.assertEqual(self.client.get("/lists/overdue/tasks").status_code, 404)
+        self.assertEqual(self.client.post("/lists/search/tasks", json={"title": "x"}).status_code, 422)
+        self.assertEqual(self.client.post("/lists/bad.id/tasks", json={"title": "x"}).status_code, 422)
+        self.assertEqual(self.pool.list_ids(), [])
+
+    def test_streamed_list_stays_loaded_until_sent(self):
+        with self.pool.use("big") as mgr:
+            mgr.add_many([{"title": f"t{i}"} for i in range(self.api.STREAM_MIN + 1)])
+        entry, holders, encode = self.pool._entries["big"], [], self.api.iter_encode_tasks
+
+        def chunks(tasks, lock):
+            for chunk in encode(tasks, lock):
+                holders.append(entry.users)
+                yield chunk
+
+        with mock.patch.object(self.api, "iter_encode_tasks", chunks):
+            response = self.client.get("/lists/big/tasks")
+        self.assertEqual(len(response.json()), self.api.STREAM_MIN + 1)
+        self.assertTrue(holders)
+        self.assertNotIn(0, holders)
+        self.assertEqual(entry.users, 0)
+
+    def test_cross_list_queries(self):
+        for list_id, title, due in [("home", "call plumber", "2020-01-05"), ("home", "report taxes", None),
+                                    ("work", "report", "2020-01-01"), ("work", "email", "2999-01-01")]:
+            self.client.post(f"/lists/{list_id}/tasks", json={"title": title, "due_date": due})
+        self.assertEqual(self.client.get("/lists").json(), [
+            {"id": "home", "tasks": 2, "statuses": {"Pending": 2}, "overdue": 1},
+            {"id": "work", "tasks": 2, "statuses": {"Pending": 2}, "overdue": 1}])
+        overdue = self.client.get("/lists/overdue").json()
+        self.assertEqual([(t["list_id"], t["title"]) for t in overdue], [("work", "report"), ("home", "call plumber")])
+        self.assertEqual(len(self.client.get("/lists/overdue", params={"limit": 1}).json()), 1)
+        found = self.client.get("/lists/search/report").json()
+        self.assertEqual([(t["list_id"], t["title"]) for t in found], [("home", "report taxes"), ("work", "report")])
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "tasks.json"))
+        for title, due in [("a", "2025-03-01"), ("b", None), ("c", "2025-01-15"),
+                           ("d", "2025-02-10"), ("e", "2025-01-15")]:
+            self.mgr.add_task(title, due_date=due)
+        self.mgr.mark_complete(4)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def titles(self, **kw):
+        return [t.title for t in self.mgr.query(**kw)]
+
+    def test_pages_by_id(self):
+        self.assertEqual(self.titles(limit=0), [])
+        self.assertEqual(self.titles(limit=0, due_after="2025-01-01"), [])
+        self.assertEqual(self.titles(limit=2), ["a", "b"])
+        self.assertEqual(self.titles(limit=2, after_id=2), ["c", "d"])
+        self.assertEqual(self.titles(sort="-id", after_id=3), ["b", "a"])
+
+    def test_status_filter(self):
+        self.assertEqual(self.titles(status="Completed"), ["d"])
+        self.assertEqual(self.titles(status="Pending", after_id=1, limit=2), ["b", "c"])
+
+    def test_due_sort_and_cursor(self):
+        self.assertEqual(self.titles(sort="due_date"), ["c", "e", "d", "a", "b"])
+        self.assertEqual(self.titles(sort="due_date", after_id=5, limit=2), ["d", "a"])
+        self.assertEqual(self.titles(sort="-due_date", limit=2), ["b", "a"])
+
+    def test_due_ranges(self):
+        self.assertEqual(self.titles(due_after="2025-01-15"), ["a", "d"])
+        self.assertEqual(self.titles(due_before="2025-03-01", sort="due_date"), ["c", "e", "d"])
+        self.assertEqual(self.titles(overdue=True, today="2025-02-20"), ["c", "e"])
+
+    def test_indexes_follow_updates(self):
+        self.mgr.update(2, due_date="2025-01-01")
+        self.mgr.delete(3)
+        self.assertEqual(self.titles(sort="due_date", limit=2), ["b", "e"])
+
+    def walk(self, limit, **kw):
+        ids, after, after_due = [], None, None
+        while True:
+            page = self.mgr.query(after_id=after, after_due=after_due, limit=limit, **kw)
+            ids += [t.id for t in page]
+            if len(page) < limit:
+                return ids
+            after, after_due = page[-1].id, page[-1].due_date or ""
+
+    def test_paging_matches_brute_force(self):
+        import random
+        rng = random.Random(7)
+        for n in range(45):
+            due = rng.choice([None, f"2025-01-{rng.randint(1, 9):02d}"])
+            t = self.mgr.add_task(f"t{n}", due_date=due)
+            if rng.random() < 0.3:
+                self.mgr.mark_complete(t.id)
+        tasks = self.mgr.get_all()
+        for kw in [{}, {"status": "Pending"}, {"due_after": "2025-01-03"}, {"due_before": "2025-01-06"},
+                   {"due_after": "2025-01-03", "status": "Completed"}, {"due_before": "2025-01-08", "status": "Pending"},
+                   {"overdue": True, "today": "2025-01-05"}, {"overdue": True, "today": "2025-01-07", "status": "Pending"},
+                   {"overdue": True, "today": "2025-01-07", "due_after": "2025-01-02"}]:
+            expected = [t for t in tasks
+                        if ("status" not in kw or t.status == kw["status"])
+                        and ("due_after" not in kw or t.due_date and t.due_date > kw["due_after"])
+                        and ("due_before" not in kw or t.due_date and t.due_date < kw["due_before"])
+                        and (not kw.get("overdue") or t.status != "Completed" and t.due_date
+                             and t.due_date < kw["today"])]
+            by_id = sorted(expected, key=lambda t: t.id)
+            by_due = sorted(expected, key=lambda t: (t.due_date is None, t.due_date or "", t.id))
+            for sort, order in [("id", by_id), ("due_date", by_due)]:
+                # Small pages walk the id index for a due range; larger ones sort the range.
+                for reverse, limit in itertools.product((False, True), (2, 7, 50)):
+                    want = [t.id for t in (order[::-1] if reverse else order)]
+                    with self.subTest(sort=sort, reverse=reverse, limit=limit, **kw):
+                        self.assertEqual(self.walk(limit, sort=("-" if reverse else "") + sort, **kw), want)
+
+    def test_cursor_survives_deleting_its_task(self):
+        self.assertEqual(self.titles(after_id=2, limit=2), ["c", "d"])
+        self.mgr.delete(2)
+        self.assertEqual(self.titles(after_id=2, limit=2), ["c", "d"])
+        self.assertEqual(self.titles(sort="-id", after_id=2), ["a"])
+        # d (2025-02-10) ended a due-sorted page; resuming needs its due date once it is gone.
+        self.mgr.delete(4)
+        self.assertEqual(self.titles(sort="due_date", after_id=4, after_due="2025-02-10"), ["a"])
+        self.assertEqual(self.titles(sort="-due_date", after_id=4, after_due="2025-02-10"), ["e", "c"])
+        with self.assertRaises(ValueError):
+            self.mgr.query(sort="due_date", after_id=4)
+
+class TestSortedKeys(unittest.TestCase):
+    def test_matches_sorted_list(self):
+        import random
+        from indexes import SortedKeys
+        rng = random.Random(1)
+        with mock.patch("indexes.LOAD", 3):
+            ref = sorted(rng.sample(range(100), 30))
+            keys = SortedKeys(ref)
+            for _ in range(500):
+                k = rng.randrange(100)
+                if k in ref:
+                    keys.remove(k)
+                    ref.remove(k)
+                else:
+                    keys.add(k)
+                    ref = sorted(ref + [k])
+                lo, hi = rng.choice([None, rng.randrange(100)]), rng.choice([None, rng.randrange(100)])
+                want = [x for x in ref if (lo is None or x > lo) and (hi is None or x < hi)]
+                self.assertEqual(list(keys.range(lo, hi)), want)
+                self.assertEqual(list(keys.range(lo, hi, reverse=True)), want[::-1])
+                self.assertEqual((len(keys), keys.first(), k in keys), (len(ref), ref[0] if ref else None, k in ref))
+
+class TestDueDates(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "tasks.json"))
+        self.late = self.mgr.add_task("late", due_date="2025-03-01")
+        self.today = self.mgr.add_task("today", due_date="2025-03-10")
+        self.soon = self.mgr.add_task("soon", due_date="2025-03-12")
+        self.mgr.add_task("later", due_date="2025-04-30")
+        self.mgr.add_task("undated")
+        self.mgr.add_task("odd", due_date="someday")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def titles(self, tasks):
+        return [t.title for t in tasks]
+
+    def test_overdue_and_upcoming_follow_mutations(self):
+        self.assertEqual(self.titles(self.mgr.overdue("2025-03-10")), ["late"])
+        self.assertEqual(self.titles(self.mgr.upcoming(2, "2025-03-10")), ["today", "soon"])
+        self.mgr.mark_complete(self.late.id)
+        self.mgr.update(self.soon.id, due_date="2025-03-09")
+        self.mgr.delete(self.today.id)
+        self.assertEqual(self.titles(self.mgr.overdue("2025-03-10")), ["soon"])
+        self.assertEqual(self.titles(self.mgr.upcoming(30, "2025-03-10")), [])
+        self.assertEqual(self.mgr.next_due("2025-03-10"), "2025-04-30")
+        self.assertEqual(self.titles(TaskManager(filepath=self.mgr.filepath).overdue("2025-03-10")), ["soon"])
+
+    def test_scheduler_reminds_once_per_task(self):
+        now = [datetime(2025, 3, 10, 9)]
+        sched = ReminderScheduler(self.mgr, clock=lambda: now[0])
+        due, next_day = sched.due_now()
+        self.assertEqual(self.titles(due), ["today"])
+        self.assertEqual(next_day.isoformat(), "2025-03-12")
+        self.assertEqual(sched.due_now()[0], [])
+        self.mgr.add_task("new", due_date="2025-03-10")
+        self.assertEqual(self.titles(sched.due_now()[0]), ["new"])
+        now[0] = datetime(2025, 4, 30)
+        self.assertEqual(self.titles(sched.due_now()[0]), ["soon", "later"])
+
+    def test_scheduler_wakes_on_new_due_task(self):
+        reminded = []
+
+        async def run():
+            sched = ReminderScheduler(self.mgr, clock=lambda: datetime(2025, 3, 11))
+            sched.add_hook(lambda t: reminded.append(t.title))
+            sched.start()
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(self.mgr.add_task, "urgent", due_date="2025-03-11")
+            for _ in range(100):
+                if len(reminded) > 0:
+                    break
+                await asyncio.sleep(0.01)
+            await sched.stop()
+
+        asyncio.run(run())
+        self.assertEqual(reminded, ["urgent"])
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.mgr = TaskManager(filepath=os.path.join(self.dir.name, "tasks.json"))
+        self.a = self.mgr.add_task("Write report", "quarterly numbers")
+        self.b = self.mgr.add_task("Review", "report draft from Sam")
+        self.c = self.mgr.add_task("Groceries", "milk, eggs")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_prefix_and_ranking(self):
+        self.assertEqual(self.mgr.search("rep"), [self.a, self.b])
+        self.assertEqual(self.mgr.search("rep", limit=1), [self.a])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.mgr.search("report draft"), [self.b])
+        self.assertEqual(self.mgr.search("report milk"), [])
+
+    def test_index_follows_mutations(self):
+        self.mgr.update(self.c.id, description="bread")
+        self.assertEqual(self.mgr.search("milk"), [])
+        self.assertEqual(self.mgr.search("bread"), [self.c])
+        self.mgr.delete(self.a.id)
+        self.assertEqual(self.mgr.search("report"), [self.b])
+
+    def test_substring_mode(self):
+        self.assertEqual(self.mgr.search("ocer"), [])
+        self.assertEqual(self.mgr.search("ocer", mode="substring"), [self.c])
+
+    def test_top_k_and_scan_rank_like_the_index(self):
+        import random
+        rng = random.Random(3)
+        words = ["report", "review", "re", "rent", "call", "cat", "email", "report"]
+        index, docs = search.SearchIndex(), []
+        for task_id in range(1, 300):
+            doc = (task_id, " ".join(rng.choices(words, k=2)), " ".join(rng.choices(words, k=rng.randint(0, 3))))
+            docs.append(doc)
+            index.add(*doc)
+        for task_id in range(1, 300, 7):
+            index.remove(task_id)
+        docs = [d for d in docs if d[0] % 7 != 1]
+        for query in ["re", "rep", "report", "c", "re ca", "email report", "zzz"]:
+            ranked = index.search(query)
+            for limit in (1, 5, 40, None):
+                with self.subTest(query=query, limit=limit):
+                    self.assertEqual(index.search(query, limit), ranked[:limit])
+                    self.assertEqual(search.scan(query, docs, limit), ranked[:limit])
+
+    def test_large_stores_index_in_the_background(self):
+        gate = threading.Event()
+
+        class SlowIndex(search.SearchIndex):
+            def __init__(self):
+                gate.wait(5)
+                super().__init__()
+
+        with mock.patch.object(tasks, "TEXT_INDEX_BACKGROUND", 0), mock.patch.object(tasks, "SearchIndex", SlowIndex):
+            # Until the index is ready, searches scan but rank the same way.
+            self.assertEqual(self.mgr.search("rep"), [self.a, self.b])
+            self.assertIsNone(self.mgr._text)
+            self.mgr.update(self.c.id, title="Report groceries")
+            self.mgr.delete(self.b.id)
+            d = self.mgr.add_task("Reply to Sam")
+            gate.set()
+            for _ in range(500):
+                if self.mgr._text is not None:
+                    break
+                time.sleep(0.01)
+        self.assertIsNotNone(self.mgr._text)
+        self.assertEqual(self.mgr.search("re"), [self.a, self.c, d])
+        self.assertEqual(self.mgr.search("milk"), [self.c])
+        self.assertEqual(self.mgr.search("sam"), [d])
+
+class TestTask(unittest.TestCase):
+    def test_compact_fields_round_trip(self):
+        d = {"id": 1, "title": "t", "description": "", "due_date": "2025-09-02",
+             "status": "Pending", "created_at": "2025-09-02T12:11:58.192565"}
+        t = Task.from_dict(d)
+        self.assertIsInstance(t._due, int)
+        self.assertIsInstance(t._created, int)
+        self.assertEqual(t.to_dict(), d)
+        self.assertFalse(hasattr(t, "__dict__"))
+
+    def test_odd_values_are_kept_verbatim(self):
+        for due, created in [("2025-02-30", "2025-09-02T12:11:58Z"), ("soon", "2025-09-02 12:11:58"),
+                             (None, "2025-09-02T12:11:58.000000"), ("", "2025-09-02T12:11:58+01:00"),
+                             (None, "2025-09-02"), (None, "20250902")]:
+            t = Task(1, "t", due_date=due, created_at=created)
+            self.assertEqual((t.due_date, t.created_at), (due, created))
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "tasks.json")
+            with open(path, "w") as f:
+                json.dump([{"id": 1, "title": "old", "created_at": "2025-01-01"}], f)
+            mgr = TaskManager(filepath=path)
+            self.assertEqual(mgr.find(1).created_at, "2025-01-01")
+            stats = mgr.import_ndjson(['{"id": 2, "title": "imported", "created_at": "2025-01-02"}'])
+            self.assertEqual((stats["imported"], mgr.find(2).created_at), (1, "2025-01-02"))
+
+    def test_status_is_interned(self):
+        a = Task.from_dict({"id": 1, "title": "a", "status": "".join(["Comp", "leted"])})
+        b = Task(2, "b")
+        b.status = "".join(["Comp", "leted"])
+        self.assertIs(a.status, b.status)
+
+class TestMetrics(unittest.TestCase):
+    def test_render_prometheus_text(self):
+        registry = Registry()
+        hist = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1), registry=registry)
+        hist.observe(0.05, "/a")
+        hist.observe(0.5, "/a")
+        hist.observe(5, "/a")
+        Counter("hits_total", "Hits.", fn=lambda: 7, registry=registry)
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE latency_seconds histogram", lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 3', lines)
+        self.assertIn("hits_total 7", lines)
+        with self.assertRaises(ValueError):
+            Counter("hits_total", "Again.", registry=registry)
+
+    def test_manager_records_timings_and_bytes(self):
+        def count(hist, op):
+            state = hist._values.get((op,))
+            return sum(state[0]) if state else 0
+        before = {op: count(tasks.OPERATION_SECONDS, op) for op in ("find", "commit", "save")}
+        written = count(tasks.WRITE_BYTES, "commit")
+        with tempfile.TemporaryDirectory() as d:
+            mgr = TaskManager(filepath=os.path.join(d, "tasks.json"))
+            mgr.add_task("one")
+            mgr.find(1)
+            mgr.save()
+            self.assertEqual(count(tasks.OPERATION_SECONDS, "find"), before["find"] + 1)
+            self.assertEqual(count(tasks.OPERATION_SECONDS, "commit"), before["commit"] + 1)
+            self.assertEqual(count(tasks.OPERATION_SECONDS, "save"), before["save"] + 1)
+            self.assertEqual(count(tasks.WRITE_BYTES, "commit"), written + 1)
+            self.assertGreater(mgr.storage.bytes_written, 0)
+            self.assertEqual(mgr.storage.size(), sum(os.path.getsize(p) for p in mgr.storage.files()))
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generated_data_is_seeded_and_loadable(self):
+        self.assertEqual(list(generate(50, seed=3)), list(generate(50, seed=3)))
+        self.assertNotEqual(list(generate(50, seed=3)), list(generate(50, seed=4)))
+        with tempfile.TemporaryDirectory() as d:
+            for backend in ("json", "journal", "sqlite"):
+                path = write_store(os.path.join(d, backend), 50, backend)
+                mgr = open_manager(backend, path)
+                self.assertEqual([t.to_dict() for t in mgr.get_all()], list(generate(50)))
+                mgr.close()
+
+    def test_compare_flags_slowdowns(self):
+        base = {"results": {"a": {"p50_us": 10.0}, "b": {"p50_us": 10.0}, "gone": {"p50_us": 1.0}}}
+        run = {"results": {"a": {"p50_us": 11.0}, "b": {"p50_us": 13.0}, "new": {"p50_us": 1.0}}}
+        rows, regressions = compare(base, run, threshold=0.2)
+        self.assertEqual([r[0] for r in rows], ["a", "b"])
+        self.assertEqual(regressions, ["b"])
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.json")
+        self.mgr = TaskManager(filepath=self.path, journal=True)
+
+    def tearDown(self):
+        self.mgr.close()
+        self.dir.cleanup()
+
+    def reopen(self):
+        self.mgr.close()
+        self.mgr = TaskManager(filepath=self.path, journal=True)
+
+    def test_replay_after_restart(self):
+        a = self.mgr.add_task("a")
+        b = self.mgr.add_task("b")
+        self.mgr.update(a.id, title="a2")
+        self.mgr.delete(b.id)
+        self.assertFalse(os.path.exists(self.path))
+        self.reopen()
+        self.assertEqual([t.title for t in self.mgr.get_all()], ["a2"])
+
+    def test_id_counter_survives_compaction(self):
+        t = self.mgr.add_task("a")
+        self.mgr.delete(t.id)
+        self.mgr.compact()
+        self.reopen()
+        self.assertEqual(self.mgr.add_task("b").id, t.id + 1)
+
+    def test_torn_tail_is_dropped(self):
+        self.mgr.add_task("a")
+        self.mgr.close()
+        with open(self.path + ".log", "ab") as f:
+            f.write(b'{"op":"put","task":{"id":2,')
+        self.reopen()
+        self.assertEqual(len(self.mgr.get_all()), 1)
+        self.mgr.add_task("b")
+        self.reopen()
+        self.assertEqual([t.title for t in self.mgr.get_all()], ["a", "b"])
+
+    def test_torn_commit_is_dropped_whole(self):
+        self.mgr.add_task("a")
+        self.mgr.add_many([{"title": f"t{i}"} for i in range(3)])
+        self.mgr.close()
+        with open(self.path + ".log", "rb") as f:
+            data = f.read()
+        with open(self.path + ".log", "wb") as f:
+            f.write(data[:data.index(b'"t2"')])
+        self.reopen()
+        self.assertEqual([t.title for t in self.mgr.get_all()], ["a"])
+        self.assertEqual(self.mgr.version, 1)
+
+    def test_reads_unframed_records(self):
+        self.mgr.close()
+        with open(self.path + ".log", "wb") as f:
+            f.write(b'{"op":"put","task":{"id":4,"title":"old","description":"","due_date":null,'
+                    b'"status":"Pending","created_at":"2025-01-01T00:00:00"}}\n{"op":"meta","meta":{"next_id":5}}\n')
+        self.reopen()
+        self.assertEqual(self.mgr.add_task("new").id, 5)
+
+    def test_compact(self):
+        for i in range(5):
+            self.mgr.add_task(f"t{i}")
+        self.mgr.mark_complete(1)
+        self.mgr.compact()
+        self.assertEqual(os.path.getsize(self.path + ".log"), 0)
+        self.assertFalse(os.path.exists(self.path + ".log.old"))
+        self.mgr.add_task("after")
+        self.reopen()
+        self.assertEqual(len(self.mgr.get_all()), 6)
+        self.assertEqual(self.mgr.find(1).status, "Completed")
+
+    def test_writers_are_not_blocked_while_the_snapshot_is_built(self):
+        self.mgr.add_task("a")
+        stage = self.mgr.storage._stage_snapshot
+        added = []
+
+        def stage_with_concurrent_write(items, meta):
+            writer = threading.Thread(target=lambda: added.append(self.mgr.add_task("during")))
+            writer.start()
+            writer.join(5)
+            return stage(items, meta)
+
+        self.mgr.storage._stage_snapshot = stage_with_concurrent_write
+        self.mgr.compact()
+        self.assertEqual(len(added), 1)
+        self.reopen()
+        self.assertEqual([t.title for t in self.mgr.get_all()], ["a", "during"])
+
+    def test_interrupted_compaction_recovers(self):
+        self.mgr.add_task("a")
+        self.mgr.close()
+        os.replace(self.path + ".log", self.path + ".log.old")
+        self.reopen()
+        self.assertEqual(len(self.mgr.get_all()), 1)
+        self.assertFalse(os.path.exists(self.path + ".log.old"))
+
+    def test_corrupt_snapshot_is_kept(self):
+        self.mgr.close()
+        with open(self.path, "w") as f:
+            f.write("[{")
+        self.reopen()
+        self.assertEqual(self.mgr.get_all(), [])
+        self.assertTrue(os.path.exists(self.path + ".corrupt"))
+
+class TestBinarySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.items = list(generate(300))
+        self.items[0].update(due_date="someday", created_at="2025-01-01T00:00:00Z")
+        self.items[1].update(due_date="", description="é" * 100)
+        self.json_path = os.path.join(self.dir.name, "tasks.json")
+        self.bin_path = os.path.join(self.dir.name, "tasks.bin")
+        with open(self.json_path, "w") as f:
+            json.dump(self.items, f)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_convert_round_trip_with_lazy_descriptions(self):
+        self.assertEqual(snapshot.convert(self.json_path, self.bin_path), 300)
+        mgr = open_manager("binary", self.bin_path)
+        self.assertIsInstance(mgr.find(2)._description, snapshot.LazyText)
+        self.assertEqual([t.to_dict() for t in mgr.get_all()], self.items)
+        self.assertIsInstance(mgr.find(2)._description, str)
+        mgr.close()
+        back = os.path.join(self.dir.name, "back.json")
+        snapshot.convert(self.bin_path, back)
+        with open(back) as f:
+            self.assertEqual(json.load(f), self.items)
+
+    def test_log_and_compaction(self):
+        snapshot.convert(self.json_path, self.bin_path)
+        mgr = open_manager("binary", self.bin_path)
+        mgr.add_task("new", "x" * 500, "2025-02-02")
+        mgr.update(2, title="renamed")
+        mgr.delete(3)
+        mgr.close()
+        mgr = open_manager("binary", self.bin_path)
+        mgr.compact()
+        mgr.close()
+        self.assertEqual(os.path.getsize(self.bin_path + ".log"), 0)
+        mgr = open_manager("binary", self.bin_path)
+        self.assertEqual(len(mgr), 300)
+        self.assertEqual((mgr.find(2).title, mgr.find(2).description), ("renamed", "é" * 100))
+        self.assertIsNone(mgr.find(3))
+        self.assertEqual(mgr.find(301).description, "x" * 500)
+        mgr.close()
+
+    def test_corrupt_snapshot_is_set_aside(self):
+        with open(self.bin_path, "wb") as f:
+            f.write(b"not a snapshot")
+        mgr = open_manager("binary", self.bin_path)
+        self.assertEqual(len(mgr), 0)
+        self.assertTrue(os.path.exists(self.bin_path + ".corrupt"))
+        mgr.close()
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.db")
+        self.mgr = TaskManager(storage=SQLiteStorage(self.path))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        a = self.mgr.add_task("a", "desc", "2025-09-02")
+        b = self.mgr.add_task("b")
+        self.mgr.mark_complete(a.id)
+        self.mgr.delete(b.id)
+        mgr = TaskManager(storage=SQLiteStorage(self.path))
+        self.assertEqual([t.to_dict() for t in mgr.get_all()], [a.to_dict()])
+        self.assertEqual(mgr.find(a.id).status, "Completed")
+
+    def test_id_counter_persists(self):
+        t = self.mgr.add_task("a")
+        self.mgr.delete(t.id)
+        mgr = TaskManager(storage=SQLiteStorage(self.path))
+        self.assertEqual(mgr.add_task("b").id, t.id + 1)
+
+    def test_indexes_and_wal(self):
+        conn = self.mgr.storage.conn
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({"tasks_status", "tasks_due_date"} <= names)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_open_manager_from_env(self):
+        os.environ["TASKS_BACKEND"] = "sqlite"
+        os.environ["TASKS_PATH"] = self.path
+        try:
+            mgr = open_manager()
+        finally:
+            del os.environ["TASKS_BACKEND"], os.environ["TASKS_PATH"]
+        self.assertIsInstance(mgr.storage, SQLiteStorage)
+
 if __name__ == "__main__":
     unittest.main()